@@ -0,0 +1,151 @@
+"""
+Shared boto3 session, clients and resources for the DPLA export scripts.
+
+Every script gets its AWS clients from here instead of calling boto3.resource()
+or boto3.client() itself, so a run builds one session, reuses connection pools
+and TLS connections, and uses the same retry/keep-alive settings everywhere.
+
+- Clients are thread-safe and shared by all threads.
+- Resources are not thread-safe, so each thread gets its own (cached) resource.
+- Neither survives fork: a forked worker process calls reset_clients() first.
+- Every HTTP request sent (retries included) is counted per service and
+  operation, see get_request_counts().
+- use_session() replaces the boto3 session with a stand-in (e.g. the
+  in-memory tables of benchmark_export.py), so scripts run without AWS.
+
+Usage:
+  from aws_clients import get_client, get_resource, get_table
+
+  s3 = get_client('s3')
+  table = get_table(os.environ['DYNAMODB_TABLE'])
+
+Configuration from environment variables:
+  REGION                    Default region when none is passed
+  AWS_MAX_POOL_CONNECTIONS  HTTP connections kept per client (default 50)
+  AWS_MAX_ATTEMPTS          Retry attempts, adaptive mode (default 10)
+"""
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# Client configuration shared by every client and resource
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50)),
+    retries={
+        'max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 10)),
+        'mode': 'adaptive',
+    },
+    tcp_keepalive=True,
+)
+
+_session = None
+_session_override = None
+_lock = threading.Lock()
+_clients = {}
+_thread_local = threading.local()
+_request_counts = {}
+_request_counts_lock = threading.Lock()
+
+
+def _count_request(event_name, **kwargs):
+    # event_name is "before-send.<service>.<Operation>"
+    operation = event_name.split('.', 1)[-1]
+    with _request_counts_lock:
+        _request_counts[operation] = _request_counts.get(operation, 0) + 1
+
+
+def get_request_counts():
+    """Number of AWS requests sent so far, keyed by '<service>.<Operation>'"""
+    with _request_counts_lock:
+        return dict(_request_counts)
+
+
+def get_session():
+    """Get or create the shared boto3 session (or the stand-in set by use_session)"""
+    global _session
+
+    with _lock:
+        if _session_override is not None:
+            return _session_override
+        if _session is None:
+            _session = boto3.session.Session()
+        return _session
+
+
+def _region(region_name):
+    return region_name or os.environ.get('REGION') or None
+
+
+def get_client(service_name, region_name=None):
+    """
+    Get the shared low-level client for a service and region.
+
+    Clients are created once per run and are safe to share between threads.
+    """
+    key = (service_name, _region(region_name))
+    client = _clients.get(key)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = session.client(service_name, region_name=key[1], config=CLIENT_CONFIG)
+                client.meta.events.register('before-send', _count_request)
+                _clients[key] = client
+    return client
+
+
+def use_session(session):
+    """
+    Create every later client and resource from session instead of boto3.
+
+    session must provide client(service_name, region_name=..., config=...) and
+    resource(...) like a boto3 Session. It is kept by reset_clients(), so forked
+    worker processes use it too. Pass None to go back to boto3.
+    """
+    global _session_override
+
+    reset_clients()
+    _session_override = session
+
+
+def reset_clients():
+    """
+    Drop the shared session, clients and resources, so the next call creates new ones.
+
+    Used in forked worker processes, which must not reuse the parent's connections.
+    """
+    global _session, _lock, _clients, _thread_local
+
+    _session = None
+    _lock = threading.Lock()
+    _clients = {}
+    _thread_local = threading.local()
+
+
+def get_resource(service_name, region_name=None):
+    """
+    Get the boto3 resource for a service and region for the current thread.
+
+    Resources are not thread-safe, so each thread gets its own, created once
+    and reused for every later call from that thread.
+    """
+    key = (service_name, _region(region_name))
+    resources = getattr(_thread_local, 'resources', None)
+    if resources is None:
+        resources = _thread_local.resources = {}
+    resource = resources.get(key)
+    if resource is None:
+        session = get_session()
+        with _lock:
+            resource = session.resource(service_name, region_name=key[1], config=CLIENT_CONFIG)
+        resource.meta.client.meta.events.register('before-send', _count_request)
+        resources[key] = resource
+    return resource
+
+
+def get_table(table_name, region_name=None):
+    """Get a DynamoDB Table for the current thread"""
+    return get_resource('dynamodb', region_name).Table(table_name)
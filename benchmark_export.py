@@ -0,0 +1,363 @@
+"""
+Offline benchmark for dlp-dpla-xml-export.py.
+
+Runs the full export pipeline against in-memory stand-ins for the DynamoDB
+tables (items, collections, language codes, RightsStatement), so performance
+changes can be measured on a laptop with no AWS access or network.
+
+The items table is synthetic: item N is generated when a scan page asks for it,
+shaped like the real schema (identifier, other_identifier, heirarchy_path,
+rights, language lists, ...), so the stand-in itself uses almost no memory and
+peak memory reflects the exporter. Each scenario runs in its own process and
+reports items/s and peak memory (RSS).
+
+The stand-in ignores FilterExpression and ProjectionExpression; the exporter's
+own prefix/visibility filters still run on every item, so the output is the same.
+
+Requirements:
+- boto3 (imported by the exporter, no AWS calls are made)
+
+Usage:
+  python benchmark_export.py                                # 10k and 100k items, 50k invalid rights
+  python benchmark_export.py --items 10000 100000 1000000
+  python benchmark_export.py --items 100000 --invalid-rights-items 0 -- --workers 4
+  python benchmark_export.py --env SCAN_SEGMENTS=4 --env EXPORT_ENGINE=async
+
+Arguments after -- are passed to the exporter (dpla_export.main).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import resource
+
+import aws_clients
+from dpla_export import main as export_main
+
+ITEMS_TABLE = 'benchmark-items'
+COLLECTION_TABLE = 'benchmark-collections'
+LANGUAGE_CODES_TABLE = 'benchmark-language-codes'
+RIGHTS_TABLE = 'RightsStatement'
+
+# Items per scan page when the scan has no Limit (DynamoDB returns ~1 MB pages)
+DEFAULT_PAGE_SIZE = 500
+
+# Identifier prefixes of real collections, covering the get_output_subdir patterns
+COLLECTION_PREFIXES = [
+    "SQI", "MTG_MGM", "VA_AM", "P6", "DH80", "REY", "LD5655.V8.T5", "VTGRAD",
+    "PRADER", "BHSST", "LJC_118", "LJC_019", "Ms1992_028_Rodeck", "BTR", "CRW",
+    "VTEC", "CIDA_CPC", "FCHS_ARC", "TAU_ART", "NMCST", "SFDST", "BCVST", "699",
+]
+
+LANGUAGE_CODES = {
+    'en': 'eng', 'fr': 'fre', 'de': 'ger', 'es': 'spa', 'it': 'ita', 'ja': 'jpn',
+    'zh': 'chi', 'ru': 'rus', 'pt': 'por', 'la': 'lat', 'ar': 'ara', 'ko': 'kor',
+}
+
+VALID_RIGHTS = [
+    ('http://rightsstatements.org/vocab/InC/1.0/', 'InC', 'In Copyright'),
+    ('http://rightsstatements.org/vocab/InC-EDU/1.0/', 'InC-EDU', 'In Copyright'),
+    ('http://rightsstatements.org/vocab/NoC-US/1.0/', 'NoC-US', 'No Copyright'),
+    ('http://rightsstatements.org/vocab/CNE/1.0/', 'CNE', 'Other'),
+    ('http://rightsstatements.org/vocab/UND/1.0/', 'UND', 'Other'),
+    ('https://creativecommons.org/publicdomain/zero/1.0/', 'CC0', 'No Copyright'),
+    ('https://creativecommons.org/licenses/by/4.0/', 'CC-BY', 'Creative Commons'),
+]
+
+# Rights values the exporter reports as invalid (the kinds seen in real data)
+INVALID_RIGHTS = [
+    'https://rightsstatements.org/page/InC/1.0/?language=en',
+    'http://rightsstatements.org/vocab/InC/2.0/',
+    '<p>See http://rightsstatements.org/vocab/NoC-US/1.0/ for details</p>',
+    '',
+]
+
+
+def collection_uuid(n):
+    return f"c0000000-0000-4000-8000-{n:012d}"
+
+
+def item_uuid(n):
+    return f"10000000-0000-4000-8000-{n:012d}"
+
+
+def make_item(n, invalid_rights_per_mille):
+    """Synthetic item number n. The same n always gives the same item."""
+    collection = n % len(COLLECTION_PREFIXES)
+    prefix = COLLECTION_PREFIXES[collection]
+    identifier = f"{prefix}_{n:07d}"
+    item = {
+        'id': item_uuid(n),
+        'identifier': identifier,
+        'title': [f"Synthetic record {n} & <friends> \"quoted\""],
+        'description': [f"Generated description for {identifier}. " * 4],
+        'language': ['en', 'fr'] if n % 7 == 0 else ['en'],
+        'subject': [f"Subject {n % 50}", f"Subject {n % 13}"],
+        'display_date': [str(1900 + n % 120)],
+        'type': ['Still Image'],
+        'format': ['image/jpeg'],
+        'medium': ['Photographs'],
+        'spatial': ['Blacksburg (Va.)'],
+        'creator': [f"Creator {n % 200}"],
+        'custom_key': f"ark:/53696/{n:08x}",
+        'thumbnail_path': f"https://img.cloud.lib.vt.edu/{prefix}/{n}/thumbnail.jpg",
+        'item_category': 'Federated',
+        'visibility': n % 20 != 0,
+        'createdAt': '2024-01-01T00:00:00.000Z',
+        'updatedAt': f"2025-{1 + n % 12:02d}-{1 + n % 28:02d}T00:00:00.000Z",
+    }
+    # Filename fallbacks: most items have one other_identifier, some several or none
+    if n % 50 == 1:
+        item['other_identifier'] = [f"{identifier.lower()}_a", f"{identifier.lower()}_b"]
+    elif n % 50 != 2:
+        item['other_identifier'] = [identifier.lower()]
+    # Collection membership: usually via heirarchy_path, sometimes is_part_of
+    if n % 25 == 3:
+        item['is_part_of'] = [prefix]
+    else:
+        item['heirarchy_path'] = [collection_uuid(collection)]
+    # Unmapped language code now and then
+    if n % 97 == 5:
+        item['language'] = ['xx']
+    # Spread invalid rights evenly (n * prime keeps them from lining up with collections)
+    if (n * 7919) % 1000 < invalid_rights_per_mille:
+        item['rights'] = [INVALID_RIGHTS[n % len(INVALID_RIGHTS)]]
+    else:
+        item['rights'] = [VALID_RIGHTS[n % len(VALID_RIGHTS)][0]]
+    return item
+
+
+class _Events:
+    def register(self, *args, **kwargs):
+        pass
+
+
+class _ClientMeta:
+    def __init__(self):
+        self.events = _Events()
+
+
+class _ResourceMeta:
+    def __init__(self):
+        self.client = type('Client', (), {'meta': _ClientMeta()})()
+
+
+class SyntheticItemsTable:
+    """Items table: scan pages are generated on demand, nothing is stored"""
+
+    def __init__(self, item_count, invalid_rights_per_mille):
+        self.item_count = item_count
+        self.invalid_rights_per_mille = invalid_rights_per_mille
+
+    def scan(self, Segment=0, TotalSegments=1, Limit=None, ExclusiveStartKey=None, **kwargs):
+        page_size = Limit or DEFAULT_PAGE_SIZE
+        n = int(ExclusiveStartKey['n']) if ExclusiveStartKey else Segment
+        items = []
+        while n < self.item_count and len(items) < page_size:
+            items.append(make_item(n, self.invalid_rights_per_mille))
+            n += TotalSegments
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': len(items)}
+        if n < self.item_count:
+            response['LastEvaluatedKey'] = {'n': n}
+        return response
+
+    def get_item(self, Key, **kwargs):
+        return {}
+
+
+class StaticTable:
+    """Small lookup table held in memory"""
+
+    def __init__(self, key_name, rows):
+        self.key_name = key_name
+        self.rows = {row[key_name]: row for row in rows}
+        self.item_count = len(self.rows)
+
+    def scan(self, **kwargs):
+        return {'Items': list(self.rows.values())}
+
+    def get_item(self, Key, **kwargs):
+        row = self.rows.get(Key[self.key_name])
+        return {'Item': dict(row)} if row else {}
+
+
+class OfflineDynamoDB:
+    """Stand-in for the boto3 DynamoDB resource (Table, batch_get_item)"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.meta = _ResourceMeta()
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for table_name, request in RequestItems.items():
+            table = self.tables[table_name]
+            responses[table_name] = [item for key in request['Keys']
+                                     for item in [table.get_item(Key=key).get('Item')] if item]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+class OfflineS3:
+    """Stand-in for the S3 client: an empty bucket"""
+
+    def __init__(self):
+        self.meta = _ClientMeta()
+
+    def get_paginator(self, operation_name):
+        return self
+
+    def paginate(self, **kwargs):
+        return iter([{'Contents': []}])
+
+
+class OfflineSession:
+    """Stand-in for boto3.session.Session, installed with aws_clients.use_session()"""
+
+    def __init__(self, item_count, invalid_rights_per_mille):
+        collections = [{'id': collection_uuid(n), 'identifier': prefix, 'title': prefix}
+                       for n, prefix in enumerate(COLLECTION_PREFIXES)]
+        languages = [{'iso_639_1': two, 'iso_639_2': three} for two, three in LANGUAGE_CODES.items()]
+        rights = [{'RightsURI': uri, 'RightsCode': code, 'RightsLabel': code, 'RightsDescription': code,
+                   'RightsCategory': category, 'IsActive': True} for uri, code, category in VALID_RIGHTS]
+        self.dynamodb = OfflineDynamoDB({
+            ITEMS_TABLE: SyntheticItemsTable(item_count, invalid_rights_per_mille),
+            COLLECTION_TABLE: StaticTable('id', collections),
+            LANGUAGE_CODES_TABLE: StaticTable('iso_639_1', languages),
+            RIGHTS_TABLE: StaticTable('RightsURI', rights),
+        })
+        self.s3 = OfflineS3()
+
+    def client(self, service_name, **kwargs):
+        return self.s3
+
+    def resource(self, service_name, **kwargs):
+        return self.dynamodb
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_one(item_count, invalid_rights_per_mille, output_dir, result_file, export_args):
+    """Run one export in this process and write its measurements to result_file"""
+    os.environ.update({
+        'REGION': 'us-east-1',
+        'ENV': 'benchmark',
+        'DYNAMODB_TABLE': ITEMS_TABLE,
+        'COLLECTION_TABLE': COLLECTION_TABLE,
+        'LANGUAGE_CODES_TABLE': LANGUAGE_CODES_TABLE,
+        'COLLECTION_IDENTIFIER': 'benchmark',
+        'LONG_URL_PATH': 'https://digitalsc.lib.vt.edu/',
+        'TYPE': 'Item',
+        'OUTPUT_BASE_DIR': output_dir,
+    })
+    os.environ.setdefault('VERBOSITY', 'quiet')
+    aws_clients.use_session(OfflineSession(item_count, invalid_rights_per_mille))
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    with open(os.path.join(output_dir, 'export_output.txt'), 'w', encoding='utf-8') as output:
+        stdout = sys.stdout
+        sys.stdout = output
+        try:
+            metrics = export_main(export_args)
+        finally:
+            sys.stdout = stdout
+    seconds = time.perf_counter() - started
+    result = {
+        'seconds': seconds,
+        'exported': metrics.get('items', {}).get('exported'),
+        'invalid_rights': metrics.get('items', {}).get('invalid_rights'),
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_before_export_mb': rss_before,
+        'worker_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN),
+        'stages': metrics.get('stages', {}),
+    }
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_scenario(name, item_count, invalid_rights_per_mille, extra_env, export_args, keep):
+    """Run one scenario in a fresh process (so peak memory is per scenario) and return its result"""
+    output_dir = tempfile.mkdtemp(prefix=f'dpla-benchmark-{item_count}-')
+    result_file = os.path.join(output_dir, 'benchmark_result.json')
+    command = [sys.executable, os.path.abspath(__file__), '--run-one', str(item_count),
+               '--invalid-rights-per-mille', str(invalid_rights_per_mille),
+               '--output-dir', output_dir, '--result-file', result_file, '--'] + export_args
+    process_env = dict(os.environ, **extra_env)
+    print(f"Running {name}: {item_count} items ...", flush=True)
+    subprocess.run(command, env=process_env, check=True)
+    with open(result_file, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    result['name'] = name
+    result['items'] = item_count
+    if keep:
+        print(f"    Output kept in {output_dir}")
+    else:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return result
+
+
+def print_results(results):
+    print()
+    print('=' * 78)
+    print('BENCHMARK RESULTS')
+    print('=' * 78)
+    print(f"{'Scenario':<22}{'Items':>9}{'Exported':>10}{'Seconds':>10}{'Items/s':>10}{'Peak MB':>9}{'Worker MB':>10}")
+    for result in results:
+        exported = result['exported'] or 0
+        rate = exported / result['seconds'] if result['seconds'] else 0
+        print(f"{result['name']:<22}{result['items']:>9}{exported:>10}{result['seconds']:>10.1f}"
+              f"{rate:>10.0f}{result['peak_rss_mb']:>9.0f}{result['worker_peak_rss_mb']:>10.0f}")
+    print('=' * 78)
+    for result in results:
+        slowest = sorted(result['stages'].items(), key=lambda stage: -stage[1]['seconds'])[:5]
+        print(f"{result['name']}: " + ', '.join(f"{name} {stage['seconds']:.1f}s" for name, stage in slowest))
+
+
+def main():
+    argv = sys.argv[1:]
+    export_args = []
+    if '--' in argv:
+        export_args = argv[argv.index('--') + 1:]
+        argv = argv[:argv.index('--')]
+
+    parser = argparse.ArgumentParser(description='Offline benchmark for dlp-dpla-xml-export.py')
+    parser.add_argument('--items', type=int, nargs='+', default=[10000, 100000],
+                        help='item counts to benchmark (e.g. 10000 100000 1000000)')
+    parser.add_argument('--invalid-rights-items', type=int, default=50000,
+                        help='item count of the scenario where every item has invalid rights (0 to skip)')
+    parser.add_argument('--invalid-rights-per-mille', type=int, default=20,
+                        help='items per thousand with invalid rights in the scaling scenarios')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment variable for the exporter (repeatable)')
+    parser.add_argument('--keep', action='store_true', help='keep the exported files')
+    parser.add_argument('--run-one', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one is not None:
+        run_one(args.run_one, args.invalid_rights_per_mille, args.output_dir, args.result_file, export_args)
+        return
+
+    extra_env = dict(kv.split('=', 1) for kv in args.env)
+    scenarios = [(f"{count // 1000}k items", count, args.invalid_rights_per_mille) for count in args.items]
+    if args.invalid_rights_items:
+        scenarios.append((f"{args.invalid_rights_items // 1000}k invalid rights", args.invalid_rights_items, 1000))
+    results = [run_scenario(name, count, per_mille, extra_env, export_args, args.keep)
+               for name, count, per_mille in scenarios]
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,10 +15,11 @@ Usage:
 
 Set AWS credentials in your environment or ~/.aws/credentials.
 """
-import boto3
 import os
 import sys
 
+from aws_clients import get_resource
+
 # Configuration from environment variables
 REGION = os.environ.get('REGION','us-east-1')
 ENV = os.environ.get('ENV','production')
@@ -36,7 +37,7 @@ print(f"========================================\n")
 
 # Connect to DynamoDB
 try:
-    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    dynamodb = get_resource('dynamodb', REGION)
     print(f"✅ Connected to DynamoDB in region '{REGION}'")
 except Exception as e:
     print(f"❌ ERROR: Failed to connect to DynamoDB: {e}")
@@ -1,15 +1,16 @@
-import boto3
 import os
 from datetime import datetime
 import mimetypes
 
+from aws_clients import get_client
+
 # S3 bucket and prefix
 bucket_name = os.environ.get('S3_BUCKET')
 prefix = os.environ.get('S3_PREFIX')
 
 print(f"DEBUG: Scanning S3 bucket '{bucket_name}' with prefix '{prefix}'")
 
-s3 = boto3.client('s3')
+s3 = get_client('s3')
 paginator = s3.get_paginator('list_objects_v2')
 page_iterator = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
 
@@ -0,0 +1,23 @@
+"""
+DPLA XML export of the digital library's DynamoDB items.
+
+Modules:
+  lookups   language codes, collection identifiers, permalinks, rights statements
+  records   build_xml(), output folder and file name, XML serialization
+  scan      S3 federated identifiers, DynamoDB scan and filters
+  writer    writing XML files and pruning orphaned ones
+  bundles   optional compressed bundle per collection folder, with an index
+  reports   invalid rights URIs report, written as the items are exported
+  exporter  main(): settings, logging, export engines and reports
+  service   long-running export service with warm caches (python -m dpla_export.service)
+
+Importing the package does not connect to AWS or create any files; an export
+runs when main() is called:
+
+  python -m dpla_export --workers 4
+  python dlp-dpla-xml-export.py --workers 4    # same, for existing .sh files
+
+  from dpla_export import build_xml, get_output_subdir, serialize_record
+"""
+from .records import build_xml, get_output_subdir, get_file_name, serialize_record
+from .exporter import main
@@ -0,0 +1,4 @@
+"""python -m dpla_export: run one export (see dpla_export.exporter.main)"""
+from .exporter import main
+
+main()
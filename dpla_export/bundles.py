@@ -0,0 +1,182 @@
+"""
+Per-collection bundles: one compressed file per output folder holding all its records,
+plus an index, as an alternative (or an addition) to one XML file per record.
+
+Formats:
+  tar.gz   a tar archive of the folder's XML files, as they are written to the folder
+  xml.gz   one XML document, <mdRecords> with one mdRecord per record
+
+Bundles are written to bundles/ in the output directory, mirroring the folders
+(e.g. bundles/SQI.tar.gz, bundles/currie/currie-asia.tar.gz), each with an index
+(bundles/SQI.index.csv) listing its records in order: identifier, file name, byte
+offset and size of the record in the uncompressed bundle, and SHA-256.
+
+Records are added in one streaming pass as they are exported; every bundle is written
+to a temp file and renamed into place when the run completes, so an interrupted run
+leaves the previous bundles untouched. A run that only exports part of the table
+(an identifier prefix or S3 filter) only replaces the bundles of folders it exported
+completely: a folder with XML files or earlier bundle entries the run did not export
+keeps its previous bundle. Timestamps are not stored, so an unchanged
+collection produces an identical bundle.
+"""
+import csv
+import gzip
+import io
+import os
+import tarfile
+
+BUNDLE_DIRNAME = 'bundles'
+BUNDLE_FORMATS = ('tar.gz', 'xml.gz')
+INDEX_FIELDS = ['Identifier', 'File', 'Offset', 'Bytes', 'SHA-256']
+
+XML_BUNDLE_HEADER = b'<?xml version="1.0" encoding="UTF-8"?>\n<mdRecords>\n'
+XML_BUNDLE_FOOTER = b'\n</mdRecords>\n'
+
+def index_path(bundle_path, bundle_format):
+    """Index file of a bundle (bundles/SQI.tar.gz -> bundles/SQI.index.csv)"""
+    return bundle_path[:-len(bundle_format) - 1] + '.index.csv'
+
+class _Bundle:
+    """One open bundle: its temp file, the gzip stream, the tar archive (tar.gz) and index rows"""
+
+    def __init__(self, path, bundle_format):
+        self.path = path
+        self.format = bundle_format
+        self.temp_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+        self.raw = open(self.temp_path, 'wb')
+        self.gzip = gzip.GzipFile(filename=os.path.basename(path)[:-3], fileobj=self.raw, mode='wb',
+                                  compresslevel=6, mtime=0)
+        self.tar = None
+        self.offset = 0
+        if bundle_format == 'tar.gz':
+            self.tar = tarfile.open(fileobj=self.gzip, mode='w', format=tarfile.PAX_FORMAT)
+        else:
+            self.gzip.write(XML_BUNDLE_HEADER)
+            self.offset = len(XML_BUNDLE_HEADER)
+        self.rows = []
+        self.index_path = index_path(path, bundle_format)
+
+    def add(self, identifier, file_name, data, data_hash):
+        if self.tar is not None:
+            info = tarfile.TarInfo(file_name)
+            info.size = len(data)
+            info.mode = 0o644
+            self.tar.addfile(info, io.BytesIO(data))
+            # The archive offset is now past the member's data, padded to whole 512-byte blocks
+            blocks, remainder = divmod(len(data), tarfile.BLOCKSIZE)
+            offset = self.tar.offset - (blocks + (remainder > 0)) * tarfile.BLOCKSIZE
+        else:
+            if self.rows:
+                self.gzip.write(b'\n')
+                self.offset += 1
+            offset = self.offset
+            self.gzip.write(data)
+            self.offset += len(data)
+        self.rows.append([identifier, file_name, offset, len(data), data_hash])
+
+    def finish(self):
+        """Close the streams and write the index; the bundle is still at its temp path"""
+        if self.tar is not None:
+            self.tar.close()
+        else:
+            self.gzip.write(XML_BUNDLE_FOOTER)
+        self.gzip.close()
+        self.raw.close()
+        index_temp_path = f'{self.temp_path}.index'
+        with open(index_temp_path, 'w', encoding='utf-8', newline='') as f:
+            index_writer = csv.writer(f)
+            index_writer.writerow(INDEX_FIELDS)
+            index_writer.writerows(self.rows)
+        os.replace(self.temp_path, self.path)
+        os.replace(index_temp_path, self.index_path)
+
+    def file_names(self):
+        return {row[1] for row in self.rows}
+
+    def discard(self):
+        self.raw.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+class BundleWriter:
+    """
+    Streams exported records into one bundle per output folder.
+    add() is called in export order from one thread; close() completes the bundles,
+    abort() drops them and keeps the previous ones.
+    """
+
+    def __init__(self, output_base_dir, bundle_format):
+        if bundle_format not in BUNDLE_FORMATS:
+            raise ValueError(f"bundle format must be one of {', '.join(BUNDLE_FORMATS)}, not {bundle_format!r}")
+        self.output_base_dir = output_base_dir
+        self.bundle_dir = os.path.join(output_base_dir, BUNDLE_DIRNAME)
+        self.format = bundle_format
+        self._bundles = {}
+        self.records = 0
+
+    def add(self, relative_path, identifier, xml_str, data_hash):
+        """Add a record's XML (relative_path being its folder/file name in the output directory)"""
+        folder, file_name = os.path.split(relative_path)
+        bundle = self._bundles.get(folder)
+        if bundle is None:
+            path = os.path.join(self.bundle_dir, f'{folder}.{self.format}')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            bundle = self._bundles[folder] = _Bundle(path, self.format)
+        bundle.add(identifier, file_name, xml_str.encode('utf-8'), data_hash)
+        self.records += 1
+
+    def known_file_names(self, folder, bundle):
+        """File names of a folder's records from earlier runs: its XML files and its previous bundle index"""
+        names = set()
+        folder_dir = os.path.join(self.output_base_dir, folder)
+        if os.path.isdir(folder_dir):
+            names.update(entry.name for entry in os.scandir(folder_dir)
+                         if entry.is_file() and entry.name.endswith('.xml'))
+        if os.path.exists(bundle.index_path):
+            with open(bundle.index_path, encoding='utf-8', newline='') as f:
+                names.update(row['File'] for row in csv.DictReader(f))
+        return names
+
+    def close(self, prune=False, partial=False):
+        """
+        Complete the bundles and move them into place. With prune, bundles (and indexes)
+        of folders this run did not export are deleted. With partial (the run only
+        exported part of the table), a folder's bundle is only replaced if the run
+        exported every record known for the folder; otherwise it is dropped.
+        Returns the paths of the bundles written.
+        """
+        written = []
+        for folder in sorted(self._bundles):
+            bundle = self._bundles[folder]
+            if partial:
+                missing = self.known_file_names(folder, bundle) - bundle.file_names()
+                if missing:
+                    print(f'DEBUG: Bundle of {folder} not updated: {len(missing)} of its records '
+                          'were not exported by this run')
+                    bundle.discard()
+                    continue
+            bundle.finish()
+            written.append(bundle.path)
+        self._bundles = {}
+        if prune and os.path.isdir(self.bundle_dir):
+            self.prune(written)
+        return written
+
+    def prune(self, written):
+        """Delete the bundle files in the bundle directory other than the written ones"""
+        kept = set(written)
+        kept.update(index_path(path, self.format) for path in written)
+        suffixes = tuple(f'.{bundle_format}' for bundle_format in BUNDLE_FORMATS) + ('.index.csv',)
+        for dir_path, _, file_names in os.walk(self.bundle_dir):
+            for file_name in sorted(file_names):
+                path = os.path.join(dir_path, file_name)
+                if path in kept or file_name.startswith('.') or not file_name.endswith(suffixes):
+                    continue
+                os.remove(path)
+                print(f'DEBUG: Deleted stale bundle file: {path}')
+
+    def abort(self):
+        """Drop the bundles of this run (e.g. after a failed scan); the previous bundles stay in place"""
+        for bundle in self._bundles.values():
+            bundle.discard()
+        self._bundles = {}
@@ -0,0 +1,913 @@
+"""
+Export DynamoDB items to DPLA XML files, one file per item in a folder per collection.
+
+main() runs one export: it reads the settings from the environment (set in the
+.sh file) and the command line, scans the items table, builds and writes the XML
+files and writes the run's reports and logs. Nothing happens at import, so the
+package can be imported by worker processes, benchmarks and long-running
+services without connecting to AWS or creating log files.
+
+Usage:
+  python -m dpla_export [--workers N] [--verbosity quiet|progress|debug]
+                        [--identifier-prefix PREFIX] [--identifiers ID [ID ...]]
+                        [--identifiers-file FILE]
+
+  from dpla_export import main
+  main(['--workers', '4'])
+  main(['--identifiers', 'SQI_PO_00001', 'SQI_PO_00002'])
+  main(['--identifiers-file', 'logs/invalid_rights_uris_prod_20250101_120000.csv'])
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone
+
+# Shared, pooled AWS clients
+from aws_clients import get_table, reset_clients, get_request_counts
+
+# Stage timers and counters, written as a JSON summary at the end of the run
+import export_metrics
+from export_metrics import timed, increment
+
+from validate_rights_uri import use_rights_registry
+
+# Persistent export state (change-data-capture watermark)
+from export_state import (STATE_FILENAME, MANIFEST_FILENAME, load_state, save_state,
+                          get_watermark, set_watermark, load_manifest, save_manifest)
+
+from . import records
+from .lookups import (language_code_stats, reset_language_code_stats, get_language_codes,
+                      language_codes_loaded, use_language_codes, load_language_codes,
+                      load_rights_registry_or_none, prefetch_collection_identifiers,
+                      prefetch_page_collections, item_collection_uuids,
+                      cached_collection_identifiers, cache_collection_identifiers)
+from .records import (debug, build_xml, get_output_subdir, get_file_name, serialize_record,
+                      write_identifier_warning, collect_identifier_warnings,
+                      write_invalid_rights, collect_invalid_rights, invalid_rights_count)
+from .reports import InvalidRightsReport
+from .scan import (get_federated_identifiers_from_s3, build_scan_kwargs, scan_items, identifier_items, filter_items,
+                   matches_identifier_prefix)
+from .bundles import BUNDLE_FORMATS, BundleWriter
+from .writer import RecordWriter, remove_output_file, prune_manifest_orphans, prune_stale_files
+
+# Output folders are written to the repo root by default (the folder above this package)
+DEFAULT_OUTPUT_BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings of the current run, set by main(); forked worker processes inherit them
+_run = {'output_base_dir': DEFAULT_OUTPUT_BASE_DIR, 'writer': RecordWriter(), 'bundled': False,
+        'log_handler': None, 'timestamp': '', 'runs_this_second': 0}
+
+def load_env():
+    """Read the export settings from the environment (set in the .sh file)"""
+    env = {}
+    env["region_name"] = "set in .sh file"
+    env["COLLECTION_IDENTIFIER"] = os.getenv("COLLECTION_IDENTIFIER")
+    env["REGION"] = os.getenv("REGION")
+    env["DYNAMODB_TABLE"] = os.getenv("DYNAMODB_TABLE")
+    env["COLLECTION_TABLE"] = os.getenv("COLLECTION_TABLE")
+    env["LONG_URL_PATH"] = os.getenv("LONG_URL_PATH")
+    env["TYPE"] = os.getenv("TYPE")
+    # Number of parallel DynamoDB scan segments (Segment/TotalSegments); 1 = sequential scan
+    env["SCAN_SEGMENTS"] = os.getenv("SCAN_SEGMENTS", "1")
+    # Optional scan page size (DynamoDB Limit); pages are otherwise capped at 1 MB
+    env["SCAN_PAGE_SIZE"] = os.getenv("SCAN_PAGE_SIZE")
+    # Incremental export: only write XML files whose content changed
+    env["INCREMENTAL_EXPORT"] = os.getenv("INCREMENTAL_EXPORT", "false").lower() == "true"
+    # Change-data-capture export: only items modified since the last run's watermark
+    env["CHANGES_SINCE_LAST_RUN"] = os.getenv("CHANGES_SINCE_LAST_RUN", "false").lower() == "true"
+    env["EXPORT_STATE_FILE"] = os.getenv("EXPORT_STATE_FILE")
+    env["EXPORT_MANIFEST_FILE"] = os.getenv("EXPORT_MANIFEST_FILE")
+    # Write each XML file to a temp file and rename it into place (no half-written files)
+    env["ATOMIC_WRITES"] = os.getenv("ATOMIC_WRITES", "true").lower() == "true"
+    # Threads writing XML files behind the main loop (sync engine); 0 = write in the main loop
+    env["WRITE_THREADS"] = os.getenv("WRITE_THREADS", "4")
+    # Optional compressed bundle per collection folder in bundles/: "tar.gz" or "xml.gz"
+    env["OUTPUT_BUNDLES"] = os.getenv("OUTPUT_BUNDLES", "").lower() or None
+    # Write one XML file per record; "false" only writes the bundles
+    env["OUTPUT_FILES"] = os.getenv("OUTPUT_FILES", "true").lower() == "true"
+    # Global secondary index on identifier, used to fetch a list of identifiers without a scan
+    env["IDENTIFIER_INDEX"] = os.getenv("IDENTIFIER_INDEX")
+    # Items per chunk sent to each worker process when running with --workers
+    env["WORKER_CHUNK_SIZE"] = os.getenv("WORKER_CHUNK_SIZE", "50")
+    # Export engine: "sync" (default) or "async" (pipelines scan, lookups and writes)
+    env["EXPORT_ENGINE"] = os.getenv("EXPORT_ENGINE", "sync").lower()
+    # Threads the async engine uses for DynamoDB calls and file writes
+    env["ASYNC_IO_THREADS"] = os.getenv("ASYNC_IO_THREADS", "16")
+
+    # Console output: "quiet" (summaries only), "progress" (periodic progress line)
+    # or "debug" (every per-item DEBUG line)
+    env["VERBOSITY"] = os.getenv("VERBOSITY", "progress").lower()
+    # Seconds between progress lines
+    env["PROGRESS_INTERVAL"] = os.getenv("PROGRESS_INTERVAL", "10")
+    return env
+
+def parse_args(argv, env):
+    """Command line options (defaults from the environment)"""
+    parser = argparse.ArgumentParser(prog="dpla_export", description="Export DynamoDB items to DPLA XML files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="render and write XML files in N worker processes (default: 1, in this process)")
+    parser.add_argument("--verbosity", choices=["quiet", "progress", "debug"],
+                        default=env["VERBOSITY"] if env["VERBOSITY"] in ("quiet", "progress", "debug") else "progress",
+                        help="console output: summaries only, a periodic progress line, or every per-item line")
+    parser.add_argument("--identifier-prefix",
+                        help="only export items whose identifier starts with PREFIX (default: IDENTIFIER_PREFIX, "
+                             "not used with --identifiers or --identifiers-file)")
+    parser.add_argument("--identifiers", nargs="+", metavar="ID",
+                        help="only export the items with these identifiers")
+    parser.add_argument("--identifiers-file", metavar="FILE",
+                        help="only export the identifiers listed in FILE: one per line, or the Identifier "
+                             "column of a CSV file (e.g. an invalid_rights_uris_*.csv report)")
+    args = parser.parse_args(argv)
+    if args.identifiers_file:
+        try:
+            file_identifiers = read_identifiers_file(args.identifiers_file)
+        except (OSError, ValueError) as e:
+            parser.error(f"cannot read identifiers from {args.identifiers_file}: {e}")
+        if not file_identifiers:
+            parser.error(f"no identifiers found in {args.identifiers_file}")
+        args.identifiers = (args.identifiers or []) + file_identifiers
+    # The .sh file's IDENTIFIER_PREFIX would silently drop listed identifiers outside it,
+    # so it only applies when no identifiers are listed (an explicit --identifier-prefix still does)
+    if args.identifier_prefix is None and not args.identifiers:
+        args.identifier_prefix = os.getenv("IDENTIFIER_PREFIX") or None
+    return args
+
+def read_identifiers_file(path):
+    """
+    Read the identifiers to export from a file: the Identifier column of a .csv file,
+    otherwise one identifier per line (blank lines and # comments are skipped).
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            reader = csv.DictReader(f)
+            if 'Identifier' not in (reader.fieldnames or []):
+                raise ValueError("CSV file has no Identifier column")
+            values = [row['Identifier'] for row in reader]
+        else:
+            values = [line.split('#', 1)[0] for line in f]
+    return [value.strip() for value in values if value.strip() and value.strip() != 'N/A']
+
+def parse_setting(env, key, default, convert=int, minimum=1):
+    """Parse a numeric setting, warning and using default if it is invalid"""
+    try:
+        return max(minimum, convert(env[key]))
+    except ValueError:
+        print(f'WARNING: Invalid {key} value "{env[key]}", using {"the default" if default is None else default}')
+        return default
+
+def setup_logging(log_dir, timestamp, debug_output):
+    """
+    Send log records to logs/dates_debug_<timestamp>.log for this run.
+    Records are buffered in memory and written to the log file in batches.
+    Returns the handler, removed again by close_logging().
+    """
+    log_filename = os.path.join(log_dir, f'dates_debug_{timestamp}.log')
+    log_file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    log_file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    log_handler = logging.handlers.MemoryHandler(capacity=1000, flushLevel=logging.CRITICAL, target=log_file_handler)
+    logging.getLogger().addHandler(log_handler)
+    # DEBUG log records are only produced with --verbosity debug
+    logging.getLogger().setLevel(logging.DEBUG if debug_output else logging.INFO)
+    return log_handler
+
+def close_logging(log_handler):
+    """Flush the run's log file and detach it from the root logger"""
+    log_file_handler = log_handler.target
+    logging.getLogger().removeHandler(log_handler)
+    log_handler.close()
+    log_file_handler.close()
+
+class ChunkLogHandler(logging.Handler):
+    """
+    Worker process log handler: keeps the log records of the chunk being exported, so the
+    parent can write them to the run's log file in scan order (as with warnings).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # Format the message now, so the record can be sent to the parent
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+def render_record(idx, item):
+    """
+    Build the XML tree for one item and work out where it is written.
+    Returns the rendered record for write_record.
+    """
+    debug(f'\nDEBUG: Processing item {idx+1}')
+    #rint(f'DEBUG: Raw item: {item}')
+    # The filename is known before building, so invalid rights records are created with it
+    file_name = get_file_name(item, idx)
+    with timed('build_xml'):
+        xml_root = build_xml(item, xml_filename=file_name)
+
+    # Use identifier field for folder mapping (based on prefix)
+    identifier = item.get("identifier", "")
+    output_subdir = get_output_subdir(identifier)
+    debug(f'DEBUG: Output subdir from mapping: {output_subdir}')
+
+    output_dir = os.path.join(_run['output_base_dir'], output_subdir)
+    debug(f'DEBUG: Output directory set to: {output_dir}')
+
+    _run['writer'].make_dir(output_dir)
+    debug(f'DEBUG: Ensured output directory exists: {output_dir}')
+    file_path = os.path.join(output_dir, file_name)
+    debug(f'DEBUG: Full file path for XML: {file_path}')
+
+    debug(f'DEBUG: Writing XML to file: {file_path}')
+    relative_path = f"{output_subdir}/{file_name}"
+    return {
+        'identifier': identifier,
+        'output_dir': output_dir,
+        'file_path': file_path,
+        'path': relative_path,
+        'key': identifier or f"path:{relative_path}",
+        'xml_root': xml_root,
+    }
+
+def write_record(record, manifest_entries=None):
+    """
+    Serialize a rendered record and write it. Safe to run in a worker thread.
+    manifest_entries maps manifest keys to their previous entry (for the unchanged-file check).
+    Returns the result for record_export_result, with 'error' set if the file could not be written.
+    """
+    result = {'key': record['key'], 'path': record['path']}
+    try:
+        with timed('serialize'):
+            xml_str = serialize_record(record['xml_root'])
+        previous = manifest_entries.get(record['key']) if manifest_entries else None
+        known_hash = previous['hash'] if previous and previous['path'] == record['path'] else None
+        with timed('write'):
+            result['outcome'], result['hash'] = _run['writer'].write_file(record['file_path'], xml_str, known_hash)
+        if _run['bundled']:
+            # Added to its collection's bundle by the process running the export, in scan order
+            result['identifier'] = record['identifier']
+            result['xml'] = xml_str
+        increment(f"files_{result['outcome']}")
+    except Exception as e:
+        # As text, so worker results can be sent back to the parent process
+        result['error'] = str(e)
+    return result
+
+def report_write_result(record, result):
+    """Print the outcome of write_record and return the result"""
+    if 'error' in result:
+        print(f"ERROR: Failed to write XML file {record['file_path']}: {result['error']}")
+        debug(f"DEBUG: Identifier {record['identifier']} mapped to folder: {record['output_dir']}")
+        return result
+    debug(f"DEBUG: Successfully generated {record['file_path']} ({result['outcome']})")
+    return result
+
+def export_record(idx, item, manifest_entries=None):
+    """
+    Build, serialize and write the XML file for one item.
+    Returns the result for record_export_result, with 'error' set if the file could not be written.
+    """
+    record = render_record(idx, item)
+    return report_write_result(record, write_record(record, manifest_entries))
+
+async def export_pages_async(pages, manifest_entries, on_result, io_threads):
+    """
+    Async export engine. boto3 is synchronous, so blocking calls run on a thread pool
+    of io_threads threads and the event loop overlaps them:
+    - the next scan page is fetched while the current one is rendered
+    - each page's collection identifiers are batch-resolved while the previous page renders
+    - the language codes and rights registry load alongside the first scan page
+    - files are serialized and written by the thread pool while later items render
+    build_xml runs on the event loop, so items are rendered (and results passed to
+    on_result) in scan order.
+    """
+    loop = asyncio.get_running_loop()
+    io_pool = ThreadPoolExecutor(max_workers=io_threads)
+    loop.set_default_executor(io_pool)
+
+    lookups = None
+    if not language_codes_loaded():
+        lookups = asyncio.gather(loop.run_in_executor(None, load_language_codes),
+                                 loop.run_in_executor(None, load_rights_registry_or_none))
+
+    # Each queued entry is a page whose collection prefetch is already running
+    page_queue = asyncio.Queue(maxsize=2)
+
+    async def fetch_pages():
+        page_iter = iter(pages)
+        try:
+            while True:
+                page = await loop.run_in_executor(None, next, page_iter, None)
+                if page is None:
+                    break
+                prefetch = loop.run_in_executor(None, prefetch_collection_identifiers,
+                                                [u for item in page for u in item_collection_uuids(item)])
+                await page_queue.put((page, prefetch))
+        finally:
+            await page_queue.put(None)
+
+    fetcher = asyncio.create_task(fetch_pages())
+    if lookups is not None:
+        language_codes, _ = await lookups
+        use_language_codes(language_codes)
+
+    pending_writes = deque()
+    idx = 0
+    try:
+        while True:
+            queued = await page_queue.get()
+            if queued is None:
+                break
+            page, prefetch = queued
+            await prefetch
+            for item in page:
+                record = render_record(idx, item)
+                idx += 1
+                write = loop.run_in_executor(None, write_record, record, manifest_entries)
+                pending_writes.append((record, write))
+                if len(pending_writes) >= io_threads * 2:
+                    record, write = pending_writes.popleft()
+                    on_result(report_write_result(record, await write))
+        while pending_writes:
+            record, write = pending_writes.popleft()
+            on_result(report_write_result(record, await write))
+        await fetcher
+    finally:
+        io_pool.shutdown(wait=True)
+
+def iter_chunks(iterable, size):
+    """Yield lists of up to size consecutive elements"""
+    chunk = []
+    for element in iterable:
+        chunk.append(element)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def init_render_worker(language_codes, rights_registry):
+    """
+    Worker process initializer: install the language codes and rights registry loaded
+    by the parent, and drop the AWS clients inherited through fork. Each worker writes
+    its files itself, through its own writer.
+    """
+    reset_clients()
+    # The parent's buffered log handler is dropped without flushing (its buffer holds the
+    # parent's records); the worker's records go back to the parent with each chunk
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    _run['log_handler'] = ChunkLogHandler()
+    root_logger.addHandler(_run['log_handler'])
+    writer = _run['writer']
+    _run['writer'] = RecordWriter(writer.incremental, writer.atomic, write_files=writer.write_files)
+    use_language_codes(language_codes)
+    if rights_registry is not None:
+        use_rights_registry(rights_registry)
+
+def render_chunk(chunk, collection_identifiers, manifest_entries):
+    """
+    Worker process: export a chunk of (idx, item) pairs. The collection identifiers the
+    chunk needs are resolved by the parent. Console output, log records, identifier
+    warnings, invalid rights entries and language code counts are returned so the parent
+    can merge them in scan order.
+    """
+    export_metrics.reset()
+    cache_collection_identifiers(collection_identifiers)
+    identifier_warnings = collect_identifier_warnings()
+    invalid_rights = collect_invalid_rights()
+    log_records = _run['log_handler'].records = []
+    language_code_stats['hits'] = language_code_stats['misses'] = 0
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        results = [export_record(idx, item, manifest_entries) for idx, item in chunk]
+    return {
+        'results': results,
+        'output': output.getvalue(),
+        'log_records': log_records,
+        'identifier_warnings': identifier_warnings,
+        'invalid_rights_uris': invalid_rights,
+        'language_code_stats': dict(language_code_stats),
+        'metrics': export_metrics.snapshot(),
+    }
+
+def main(argv=None):
+    """
+    Run one export. argv are the command line options (default: sys.argv[1:]).
+
+    Returns:
+        The run summary written to logs/export_metrics_<env>_<timestamp>.json
+    """
+    run_started = time.perf_counter()
+    requests_before = get_request_counts()
+    env = load_env()
+    args = parse_args(argv, env)
+    debug_output = args.verbosity == "debug"
+
+    # Output folder logic based on identifier
+    # Write directly to repo root (or OUTPUT_BASE_DIR, e.g. for benchmarks); logs/ goes there too
+    output_base_dir = os.getenv("OUTPUT_BASE_DIR") or DEFAULT_OUTPUT_BASE_DIR
+    _run['output_base_dir'] = output_base_dir
+
+    # Add a timestamp to the log file name
+    log_dir = os.path.join(output_base_dir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Runs in one process (the export service) within the same second get distinct
+    # timestamps, which name the run's logs and mark its manifest entries
+    if timestamp == _run['timestamp'].split('-')[0]:
+        _run['runs_this_second'] += 1
+        timestamp = f"{timestamp}-{_run['runs_this_second']}"
+    else:
+        _run['runs_this_second'] = 1
+    _run['timestamp'] = timestamp
+    log_handler = setup_logging(log_dir, timestamp, debug_output)
+    try:
+        return run_export(env, args, output_base_dir, log_dir, timestamp, run_started, requests_before)
+    finally:
+        records.end_run()
+        close_logging(log_handler)
+
+def run_export(env, args, output_base_dir, log_dir, timestamp, run_started, requests_before):
+    """The export itself, once main() has set up the settings and the run's log file"""
+    # Set up warning file for identifier issues and fallbacks
+    multiple_identifiers_warning_file = os.path.join(log_dir, f'identifier_warnings_{timestamp}.txt')
+
+    # Set up file for tracking invalid rights URIs
+    env_name = os.getenv("ENV", "unknown")  # Get environment (prod/preprod)
+    invalid_rights_uris_file = os.path.join(log_dir, f'invalid_rights_uris_{env_name}_{timestamp}.txt')
+    invalid_rights_uris_csv_file = os.path.join(log_dir, f'invalid_rights_uris_{env_name}_{timestamp}.csv')
+    metrics_summary_file = os.path.join(log_dir, f'export_metrics_{env_name}_{timestamp}.json')
+    export_metrics.reset()
+    reset_language_code_stats()
+
+    # DEBUG: Script started
+    print('DEBUG: Starting dpla_xmloutput.py')
+    s3_prefix_config = os.getenv("S3_PREFIX")
+    if s3_prefix_config:
+        print(f'       Filtering enabled: S3_PREFIX="{s3_prefix_config}" + visibility=True')
+    else:
+        print('       Filtering enabled: visibility=True only (no S3 filtering)')
+
+    # DEBUG: Print environment variables
+    print(f'DEBUG: Environment variables loaded: {env}')
+
+    # Check for missing environment variables
+    for key in ["COLLECTION_IDENTIFIER", "REGION", "DYNAMODB_TABLE", "LONG_URL_PATH", "TYPE"]:
+        if not env[key]:
+            print(f'WARNING: Environment variable {key} is not set!')
+    if not env["COLLECTION_TABLE"]:
+        print('WARNING: COLLECTION_TABLE is not set — dcterms:isPartOf will be skipped')
+
+    # Setup DynamoDB resource
+    try:
+        dbtable = get_table(env["DYNAMODB_TABLE"], env["REGION"])
+        print(f'DEBUG: Connected to DynamoDB table: {env["DYNAMODB_TABLE"]}')
+    except Exception as e:
+        print(f'ERROR: Failed to connect to DynamoDB: {e}')
+        raise
+
+    total_segments = parse_setting(env, "SCAN_SEGMENTS", 1)
+    print(f'DEBUG: Output base directory set to: {output_base_dir}')
+
+    # Get federated identifiers from S3 (needed before the scan starts streaming items)
+    print()
+    print('='*70)
+    s3_prefix_check = os.getenv("S3_PREFIX")
+    if s3_prefix_check:
+        print('S3-BASED FEDERATED FILTERING')
+    else:
+        print('NO S3 FILTERING (S3_PREFIX not set or empty)')
+    print('='*70)
+    with timed('s3_listing'):
+        federated_identifiers = get_federated_identifiers_from_s3(env["REGION"])
+    invalid_rights_report = InvalidRightsReport(invalid_rights_uris_file, invalid_rights_uris_csv_file)
+    records.start_run(multiple_identifiers_warning_file, debug_output=args.verbosity == "debug",
+                      s3_identifiers=federated_identifiers, invalid_rights_report=invalid_rights_report)
+
+    filter_prefix = args.identifier_prefix  # IDENTIFIER_PREFIX, set in your .sh script
+    # Targeted export of a list of identifiers: only those records are exported (and pruned)
+    target_identifiers = set(args.identifiers) if args.identifiers else None
+    print()
+    print('='*70)
+    print('FILTERING (applied to each scan page as it streams in)')
+    print('='*70)
+    print(f'DEBUG: Identifier prefix: {filter_prefix if filter_prefix else "Not set (all items)"}')
+    if target_identifiers:
+        print(f'DEBUG: Identifiers: {len(target_identifiers)} listed (only these items are exported)')
+    if federated_identifiers:
+        print('DEBUG: S3 federated identifiers: enabled (via S3_PREFIX)')
+    else:
+        print('DEBUG: No S3 filtering applied (S3_PREFIX not set or S3 was empty)')
+    print('DEBUG: Visibility: only items with visibility=True')
+    print('='*70)
+    print()
+
+    worker_chunk_size = parse_setting(env, "WORKER_CHUNK_SIZE", 50)
+    async_io_threads = parse_setting(env, "ASYNC_IO_THREADS", 16)
+    write_threads = parse_setting(env, "WRITE_THREADS", 4, minimum=0)
+
+    # Query all items from DynamoDB (scan example, not efficient for big tables)
+    # Scan for all Federated and do each collection individually and put in collection folders
+    # JLG 09/08/2025
+    # Items stream through scan page -> filters -> build_xml -> write, so memory stays
+    # bounded by the scan page size rather than the table size.
+    state_file = env["EXPORT_STATE_FILE"] or os.path.join(output_base_dir, STATE_FILENAME)
+    export_state = load_state(state_file)
+    modified_since = None
+    if env["CHANGES_SINCE_LAST_RUN"] and target_identifiers:
+        print('DEBUG: Change-data-capture export is not used for a list of identifiers')
+    elif env["CHANGES_SINCE_LAST_RUN"]:
+        modified_since = get_watermark(export_state, env["DYNAMODB_TABLE"], filter_prefix)
+        if modified_since:
+            print(f'DEBUG: Change-data-capture export: items modified after {modified_since}')
+        else:
+            print('DEBUG: Change-data-capture export: no watermark yet, exporting all items')
+    # Items written while the scan runs may carry timestamps older than the newest one seen,
+    # so the next watermark is capped at the time this scan started
+    scan_started_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    page_size = parse_setting(env, "SCAN_PAGE_SIZE", None) if env["SCAN_PAGE_SIZE"] else None
+    scan_kwargs = build_scan_kwargs(modified_since, page_size, target_identifiers)
+    print('DEBUG: Scan filters pushed to DynamoDB: visibility=True')
+    if filter_prefix:
+        print(f'DEBUG: Identifier prefix {filter_prefix} is applied to the scanned items (ignoring case)')
+    pipeline_stats = {
+        'pages': 0,
+        'scanned': 0,
+        'max_modified': None,
+        'scan_error': None,
+        'excluded_identifiers': 0,
+        'excluded_prefix': 0,
+        'excluded_s3': 0,
+        'excluded_visibility': 0,
+        'hidden': set(),
+        'kept': 0,
+        'not_found': [],
+    }
+    write_stats = {'added': 0, 'changed': 0, 'unchanged': 0, 'deleted': 0}
+
+    # Manifest of exported files (identifier -> path, hash, last run), kept in incremental
+    # and change-data-capture modes and used to prune orphaned files without a directory walk
+    # Bundles hold every record of a collection folder, so runs that only export part of
+    # the table (changed items, a list of identifiers) do not write them
+    bundle_format = env["OUTPUT_BUNDLES"]
+    if bundle_format and bundle_format not in BUNDLE_FORMATS:
+        print(f'WARNING: OUTPUT_BUNDLES must be one of {", ".join(BUNDLE_FORMATS)}, not "{bundle_format}"; '
+              'no bundles are written')
+        bundle_format = None
+    elif bundle_format and (modified_since or target_identifiers):
+        print('WARNING: Bundles are not written by change-data-capture or identifier-list exports')
+        bundle_format = None
+    write_files = env["OUTPUT_FILES"] or not bundle_format
+    if not write_files:
+        print('DEBUG: OUTPUT_FILES=false: only bundles are written, no XML files')
+    elif not env["OUTPUT_FILES"]:
+        print('WARNING: OUTPUT_FILES=false needs OUTPUT_BUNDLES, writing XML files')
+    bundles = None
+    if bundle_format:
+        bundles = BundleWriter(output_base_dir, bundle_format)
+        print(f'DEBUG: Writing a {bundle_format} bundle per collection to {bundles.bundle_dir}')
+    _run['bundled'] = bundles is not None
+
+    # Bundles are always written whole, so a bundles-only run keeps no manifest
+    manifest_enabled = (env["INCREMENTAL_EXPORT"] or env["CHANGES_SINCE_LAST_RUN"]) and write_files
+    manifest_file = env["EXPORT_MANIFEST_FILE"] or os.path.join(output_base_dir, MANIFEST_FILENAME)
+    manifest = load_manifest(manifest_file) if manifest_enabled else None
+    manifest_is_new = manifest_enabled and manifest is None
+    if manifest_is_new:
+        print(f'DEBUG: No export manifest found, creating {manifest_file}')
+        manifest = {}
+    written_paths = set()
+    renamed_paths = set()
+    failed_keys = set()
+    failed_paths = set()
+
+    progress_interval = parse_setting(env, "PROGRESS_INTERVAL", 10.0, convert=float, minimum=0.0)
+    progress_state = {'started': time.monotonic(), 'last': time.monotonic(), 'table_items': None}
+    if args.verbosity == "progress":
+        try:
+            # Approximate (DynamoDB refreshes it every few hours), only used for the ETA
+            progress_state['table_items'] = dbtable.item_count
+        except Exception as e:
+            print(f'WARNING: Could not read the item count of {env["DYNAMODB_TABLE"]}, no ETA: {e}')
+
+    def report_progress(final=False):
+        """
+        Print a progress line (--verbosity progress) at most every PROGRESS_INTERVAL seconds:
+        items exported and items/s, scan and filter counts, write outcomes and an ETA
+        based on how much of the table has been scanned.
+        """
+        if args.verbosity != "progress":
+            return
+        now = time.monotonic()
+        if not final and now - progress_state['last'] < progress_interval:
+            return
+        progress_state['last'] = now
+        elapsed = now - progress_state['started']
+        exported = write_stats['added'] + write_stats['changed'] + write_stats['unchanged']
+        rate = exported / elapsed if elapsed > 0 else 0.0
+        scanned = pipeline_stats['scanned']
+        excluded = (pipeline_stats['excluded_identifiers'] + pipeline_stats['excluded_prefix']
+                    + pipeline_stats['excluded_s3'] + pipeline_stats['excluded_visibility'])
+        if final:
+            eta = 'done'
+        elif progress_state['table_items'] and scanned:
+            remaining = max(progress_state['table_items'] - scanned, 0)
+            eta = f"{remaining * elapsed / scanned:.0f}s"
+        else:
+            eta = 'unknown'
+        line = (f"PROGRESS: {exported} items exported ({rate:.1f} items/s) | "
+                f"scanned {scanned} in {pipeline_stats['pages']} pages, {excluded} excluded | "
+                f"added {write_stats['added']}, changed {write_stats['changed']}, unchanged {write_stats['unchanged']} | "
+                f"invalid rights {invalid_rights_count()} | ETA {eta}")
+        print(line, flush=True)
+        logging.info(line)
+
+    def record_export_result(result):
+        """Count a written record, add it to its bundle, update its manifest entry and report progress"""
+        if 'error' in result:
+            # The previous file (and manifest entry) of a record that failed to write are kept
+            failed_keys.add(result['key'])
+            failed_paths.add(result['path'])
+        else:
+            write_stats[result['outcome']] += 1
+            if bundles is not None:
+                with timed('bundle'):
+                    bundles.add(result['path'], result['identifier'], result.pop('xml'), result['hash'])
+            if manifest is not None:
+                written_paths.add(result['path'])
+                previous = manifest.get(result['key'])
+                # The record's filename or folder changed: its old file is removed after the run
+                if previous and previous['path'] != result['path']:
+                    renamed_paths.add(previous['path'])
+                manifest[result['key']] = {'path': result['path'], 'hash': result['hash'], 'last_seen': timestamp}
+        report_progress()
+
+    def merge_chunk_result(chunk_result):
+        """Merge a worker's chunk into this process, in scan order"""
+        print(chunk_result['output'], end='')
+        for log_record in chunk_result['log_records']:
+            logging.getLogger(log_record.name).handle(log_record)
+        for warning_msg in chunk_result['identifier_warnings']:
+            write_identifier_warning(warning_msg)
+        for invalid_item in chunk_result['invalid_rights_uris']:
+            write_invalid_rights(invalid_item)
+        language_code_stats['hits'] += chunk_result['language_code_stats']['hits']
+        language_code_stats['misses'] += chunk_result['language_code_stats']['misses']
+        language_code_stats['unmapped'].update(chunk_result['language_code_stats']['unmapped'])
+        export_metrics.merge(chunk_result['metrics'])
+        for result in chunk_result['results']:
+            record_export_result(result)
+
+    if target_identifiers:
+        # A list of identifiers is fetched through IDENTIFIER_INDEX when it is set
+        pages = identifier_items(env["DYNAMODB_TABLE"], env["REGION"], env["IDENTIFIER_INDEX"], target_identifiers,
+                                 total_segments, scan_kwargs, pipeline_stats)
+    else:
+        pages = scan_items(env["DYNAMODB_TABLE"], env["REGION"], total_segments, scan_kwargs, pipeline_stats)
+    filtered_pages = filter_items(pages, pipeline_stats, filter_prefix, federated_identifiers, target_identifiers)
+    items = (item for page in prefetch_page_collections(filtered_pages) for item in page)
+    # Write-behind threads are only used by the sync engine in this process: the async engine
+    # writes on its own thread pool, workers write in their own processes, and debug output
+    # keeps each item's lines together
+    if env["EXPORT_ENGINE"] == "async" or args.workers > 1 or args.verbosity == "debug":
+        write_threads = 0
+    writer = RecordWriter(env["INCREMENTAL_EXPORT"] and write_files, env["ATOMIC_WRITES"], write_threads, write_files)
+    _run['writer'] = writer
+    try:
+        if env["EXPORT_ENGINE"] == "async":
+            if args.workers > 1:
+                print('WARNING: --workers is not used by the async export engine')
+            print(f'DEBUG: Async export engine ({async_io_threads} I/O threads)')
+            asyncio.run(export_pages_async(filtered_pages, manifest, record_export_result, async_io_threads))
+        elif args.workers > 1:
+            # Workers are forked before the scan threads start and inherit the caches loaded so far
+            language_codes = get_language_codes()
+            rights_registry = load_rights_registry_or_none()
+            print(f'DEBUG: Rendering XML in {args.workers} worker processes ({worker_chunk_size} items per chunk)')
+            render_pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('fork'),
+                                              initializer=init_render_worker, initargs=(language_codes, rights_registry))
+            # All workers are forked on the first submit
+            render_pool.submit(int).result()
+            with render_pool:
+                pending_chunks = deque()
+                for chunk in iter_chunks(enumerate(items), worker_chunk_size):
+                    collection_identifiers = cached_collection_identifiers(item for _, item in chunk)
+                    manifest_entries = {}
+                    if manifest:
+                        manifest_entries = {item['identifier']: manifest[item['identifier']] for _, item in chunk
+                                            if item.get('identifier') in manifest}
+                    pending_chunks.append(render_pool.submit(render_chunk, chunk, collection_identifiers, manifest_entries))
+                    if len(pending_chunks) >= args.workers * 2:
+                        merge_chunk_result(pending_chunks.popleft().result())
+                while pending_chunks:
+                    merge_chunk_result(pending_chunks.popleft().result())
+        else:
+            for idx, item in enumerate(items):
+                record = render_record(idx, item)
+                for written, result in writer.submit(record, write_record, record, manifest):
+                    record_export_result(report_write_result(written, result))
+            for written, result in writer.drain():
+                record_export_result(report_write_result(written, result))
+    except BaseException:
+        if bundles is not None:
+            bundles.abort()
+        raise
+    finally:
+        writer.close()
+
+    report_progress(final=True)
+
+    # Files left behind at the old location of renamed records
+    for relative_path in sorted(renamed_paths - written_paths):
+        if remove_output_file(output_base_dir, relative_path, 'renamed'):
+            write_stats['deleted'] += 1
+
+    print()
+    print('='*70)
+    print('FILTERING SUMMARY')
+    print('='*70)
+    print(f'DEBUG: Items retrieved from DynamoDB: {pipeline_stats["scanned"]} ({pipeline_stats["pages"]} scan pages)')
+    if target_identifiers:
+        print(f'       ({pipeline_stats["excluded_identifiers"]} items excluded: identifier not in the list)')
+        if pipeline_stats['not_found']:
+            print(f'       ({len(pipeline_stats["not_found"])} listed identifiers not found in DynamoDB)')
+    if filter_prefix:
+        print(f'       ({pipeline_stats["excluded_prefix"]} items excluded: identifier does not start with {filter_prefix})')
+    if federated_identifiers:
+        print(f'       ({pipeline_stats["excluded_s3"]} items excluded: not in S3 federated prefix)')
+    print(f'       ({pipeline_stats["excluded_visibility"]} items excluded: visibility=False or missing)')
+    print(f'DEBUG: Items exported: {pipeline_stats["kept"]}')
+    if pipeline_stats['scan_error']:
+        print(f'WARNING: DynamoDB scan ended early, export is incomplete: {pipeline_stats["scan_error"]}')
+    print('='*70)
+
+    # Remove XML files for records that no longer exist or are no longer visible.
+    # A manifest entry is only pruned if this run would have exported it:
+    # - change-data-capture runs only see changed items, so only records seen hidden are pruned
+    # - prefix/S3-filtered runs prune entries inside their identifier prefix / S3 identifiers,
+    #   tested with the same predicates filter_items applies to the scanned items
+    # - runs for a list of identifiers only prune entries of those identifiers
+    # - a run whose scan failed prunes nothing
+    # - records whose file failed to write are never pruned
+    def in_prune_scope(manifest_key):
+        if manifest_key in failed_keys:
+            return False
+        if modified_since:
+            return manifest_key in pipeline_stats['hidden']
+        if manifest_key.startswith('path:'):
+            return not (filter_prefix or federated_identifiers or target_identifiers)
+        if target_identifiers and manifest_key not in target_identifiers:
+            return False
+        if filter_prefix and not matches_identifier_prefix(manifest_key, filter_prefix):
+            return False
+        if federated_identifiers and manifest_key not in federated_identifiers:
+            return False
+        return True
+
+    bundle_paths = []
+    if bundles is not None:
+        if pipeline_stats['scan_error']:
+            print('WARNING: Bundles not updated (incomplete run), the previous bundles are kept')
+            bundles.abort()
+        else:
+            # A run over the whole table also removes the bundles of folders it no longer exports;
+            # a prefix/S3-filtered run only replaces the bundles of folders it exported completely
+            partial_run = bool(filter_prefix or federated_identifiers)
+            with timed('bundle'):
+                bundle_paths = bundles.close(prune=not partial_run, partial=partial_run)
+            print(f'DEBUG: Wrote {len(bundle_paths)} {bundle_format} bundles ({bundles.records} records) '
+                  f'to {bundles.bundle_dir}')
+
+    if manifest_enabled:
+        if pipeline_stats['scan_error']:
+            print('DEBUG: Skipping orphaned file pruning (incomplete run)')
+        else:
+            write_stats['deleted'] += prune_manifest_orphans(output_base_dir, manifest, timestamp, in_prune_scope)
+            # First run with a manifest: files exported before it existed are not in it yet
+            # (those of records that failed to write this run are kept)
+            if manifest_is_new and not (filter_prefix or federated_identifiers or target_identifiers or modified_since):
+                exported_paths = {os.path.join(output_base_dir, path)
+                                  for path in failed_paths.union(entry['path'] for entry in manifest.values())}
+                output_dirs = {os.path.dirname(path) for path in exported_paths}
+                write_stats['deleted'] += prune_stale_files(output_dirs, exported_paths)
+        save_manifest(manifest_file, manifest)
+        print(f'DEBUG: Export manifest saved: {len(manifest)} entries ({manifest_file})')
+        print()
+        print('='*70)
+        print('INCREMENTAL EXPORT SUMMARY')
+        print('='*70)
+        print(f"Added:     {write_stats['added']}")
+        print(f"Changed:   {write_stats['changed']}")
+        print(f"Unchanged: {write_stats['unchanged']}")
+        print(f"Deleted:   {write_stats['deleted']}")
+        print('='*70)
+
+    # Persist the change-data-capture watermark once the scan has completed
+    if env["CHANGES_SINCE_LAST_RUN"] and not target_identifiers:
+        if pipeline_stats['scan_error']:
+            print('WARNING: Scan did not complete, keeping the previous change-data-capture watermark')
+        else:
+            new_watermark = pipeline_stats['max_modified'] or modified_since
+            if new_watermark and new_watermark > scan_started_at:
+                new_watermark = scan_started_at
+            if modified_since and new_watermark < modified_since:
+                new_watermark = modified_since
+            if new_watermark:
+                set_watermark(export_state, env["DYNAMODB_TABLE"], filter_prefix, new_watermark)
+                save_state(state_file, export_state)
+                print(f'DEBUG: Change-data-capture watermark saved: {new_watermark} ({state_file})')
+
+    # Complete the invalid rights URIs report (written while the items were exported)
+    if invalid_rights_report.count:
+        invalid_rights_report.close()
+        print(f"    CSV file generated: {invalid_rights_uris_csv_file}")
+
+    # Stage timings, counters and AWS requests for comparing runs
+    wall_seconds = time.perf_counter() - run_started
+    items_exported = write_stats['added'] + write_stats['changed'] + write_stats['unchanged']
+    aws_requests = {operation: count - requests_before.get(operation, 0)
+                    for operation, count in get_request_counts().items()
+                    if count > requests_before.get(operation, 0)}
+    summary = export_metrics.write_summary(metrics_summary_file, {
+        'run': timestamp,
+        'env': env_name,
+        'table': env["DYNAMODB_TABLE"],
+        'engine': env["EXPORT_ENGINE"],
+        'workers': args.workers,
+        'scan_segments': total_segments,
+        'identifier_prefix': filter_prefix,
+        'identifiers': len(target_identifiers) if target_identifiers else None,
+        'incremental_export': env["INCREMENTAL_EXPORT"],
+        'bundles': {'format': bundle_format, 'written': len(bundle_paths), 'xml_files': write_files},
+        'changes_since': modified_since,
+        'complete': not pipeline_stats['scan_error'],
+        'wall_seconds': round(wall_seconds, 3),
+        'items_per_second': round(items_exported / wall_seconds, 1) if wall_seconds > 0 else None,
+        'items': {
+            'scanned': pipeline_stats['scanned'],
+            'scan_pages': pipeline_stats['pages'],
+            'excluded_identifiers': pipeline_stats['excluded_identifiers'],
+            'identifiers_not_found': len(pipeline_stats['not_found']),
+            'excluded_prefix': pipeline_stats['excluded_prefix'],
+            'excluded_s3': pipeline_stats['excluded_s3'],
+            'excluded_visibility': pipeline_stats['excluded_visibility'],
+            'exported': items_exported,
+            'added': write_stats['added'],
+            'changed': write_stats['changed'],
+            'unchanged': write_stats['unchanged'],
+            'deleted': write_stats['deleted'],
+            'invalid_rights': invalid_rights_report.count,
+        },
+        'language_codes': {'hits': language_code_stats['hits'], 'misses': language_code_stats['misses']},
+        'aws_requests_total': sum(aws_requests.values()),
+        'aws_requests': dict(sorted(aws_requests.items())),
+    })
+
+    # Print summary about multiple identifiers
+    print("\n" + "="*70)
+    print("SCRIPT COMPLETE")
+    print("="*70)
+
+    # Summary for invalid rights URIs
+    if invalid_rights_report.count:
+        print(f"⚠️  INVALID RIGHTS URIS: {invalid_rights_report.count} items have invalid/empty rights URIs!")
+        print(f"    Review text file: {invalid_rights_uris_file}")
+        print(f"    Review CSV file:  {invalid_rights_uris_csv_file}")
+    else:
+        print(f"✅ All rights URIs are valid!")
+
+    print()
+
+    # Summary for language code lookups
+    print(f"Language codes: {language_code_stats['hits']} mapped, {language_code_stats['misses']} unmapped lookups")
+    if language_code_stats['unmapped']:
+        print(f"    Unmapped values: {sorted(str(v) for v in language_code_stats['unmapped'])}")
+
+    print()
+
+    if os.path.exists(multiple_identifiers_warning_file) and os.path.getsize(multiple_identifiers_warning_file) > 0:
+        print(f"⚠️  NOTICE: Some items have identifier issues or used fallbacks!")
+        print(f"    Review this file: {multiple_identifiers_warning_file}")
+        print(f"    Issues may include:")
+        print(f"      - Multiple other_identifier values (using first)")
+        print(f"      - Missing other_identifier (using identifier field)")
+        print(f"      - Missing both identifiers (using generated name)")
+    else:
+        print(f"✅ All items have single other_identifier values. No fallbacks used.")
+    print()
+    print(f"Run metrics ({wall_seconds:.1f}s, {sum(aws_requests.values())} AWS requests): {metrics_summary_file}")
+    print("="*70)
+    return summary
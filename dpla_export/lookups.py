@@ -0,0 +1,344 @@
+"""
+Lookup tables used while building records: language codes, collection
+identifiers, permalinks and rights statements.
+
+The language codes and collection identifiers are cached in memory for the
+life of the process, so a process that runs several exports (or a worker
+process given the parent's tables) only loads them once.
+"""
+import json
+import logging
+import os
+import time
+
+from aws_clients import get_resource, get_table
+from export_metrics import timed, increment
+from validate_rights_uri import validate_rights_uri, get_rights_info, load_rights_registry, use_rights_registry
+
+# ISO 639-1 -> ISO 639-2 mapping, loaded once per process by get_iso_639_2_code()
+_language_codes = None
+language_code_stats = {'hits': 0, 'misses': 0, 'unmapped': set()}
+
+def load_language_codes():
+    """
+    Load the whole language codes table into memory with a single paginated scan.
+    If LANGUAGE_CODES_SNAPSHOT points to an existing JSON file ({"en": "eng", ...}),
+    it is used instead of DynamoDB; if it points to a missing file, the scanned
+    table is saved there for the next run.
+    Returns a dict mapping iso_639_1 -> iso_639_2 (empty if the table cannot be read).
+    """
+    snapshot_path = os.getenv("LANGUAGE_CODES_SNAPSHOT")
+    if snapshot_path and os.path.exists(snapshot_path):
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            codes = json.load(f)
+        print(f'DEBUG: Loaded {len(codes)} language codes from snapshot {snapshot_path}')
+        return codes
+
+    codes = {}
+    try:
+        region = os.getenv("REGION")
+        lang_table_name = os.getenv("LANGUAGE_CODES_TABLE")
+        lang_table = get_table(lang_table_name, region)
+        scan_kwargs = {
+            "ProjectionExpression": "iso_639_1, iso_639_2",
+        }
+        response = lang_table.scan(**scan_kwargs)
+        rows = response.get("Items", [])
+        while 'LastEvaluatedKey' in response:
+            response = lang_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+            rows.extend(response.get("Items", []))
+        codes = {row['iso_639_1']: row['iso_639_2'] for row in rows if row.get('iso_639_1') and row.get('iso_639_2')}
+        print(f'DEBUG: Loaded {len(codes)} language codes from {lang_table_name}')
+    except Exception as e:
+        print(f"WARNING: Could not load language codes table: {e}")
+        return codes
+
+    if snapshot_path:
+        with open(snapshot_path, 'w', encoding='utf-8') as f:
+            json.dump(codes, f, indent=2, sort_keys=True)
+        print(f'DEBUG: Saved language codes snapshot to {snapshot_path}')
+    return codes
+
+def get_language_codes():
+    """The language codes table, loaded on first use"""
+    global _language_codes
+    if _language_codes is None:
+        with timed('language_codes_load'):
+            _language_codes = load_language_codes()
+    return _language_codes
+
+def language_codes_loaded():
+    return _language_codes is not None
+
+def use_language_codes(codes):
+    """Use an already loaded language codes table (e.g. the parent's, in a worker process)"""
+    global _language_codes
+    _language_codes = codes
+
+def reset_language_code_stats():
+    """Clear the language code lookup counts and unmapped values (at the start of a run)"""
+    language_code_stats['hits'] = language_code_stats['misses'] = 0
+    language_code_stats['unmapped'].clear()
+
+# Function to look up ISO 639-2 code from the in-memory language codes table
+def get_iso_639_2_code(iso_639_1):
+    """
+    Look up the ISO 639-2 code in the language codes table (loaded on first use).
+    Returns the 3-letter code if found, else returns the original value.
+    """
+    iso_639_2 = get_language_codes().get(iso_639_1)
+    if iso_639_2 is not None:
+        language_code_stats['hits'] += 1
+        return iso_639_2
+
+    language_code_stats['misses'] += 1
+    if iso_639_1 not in language_code_stats['unmapped']:
+        language_code_stats['unmapped'].add(iso_639_1)
+        print(f"WARNING: Could not map language code '{iso_639_1}': not in language codes table")
+    return iso_639_1
+
+def get_permalink(item):
+    long_url_path = os.getenv("LONG_URL_PATH")
+    item_type = os.getenv("TYPE")
+    custom_key = item.get("custom_key", "")
+    noid = custom_key.split("/")[-1] if custom_key else ""
+    if long_url_path and item_type and noid:
+        return f"{long_url_path.rstrip('/')}/{item_type}/{noid}"
+    print(f"WARNING: Could not construct permalink for item: long_url_path={long_url_path}, item_type={item_type}, noid={noid}")
+    return ""
+
+
+# Cache for collection UUID -> identifier lookups to avoid repeated DynamoDB calls
+_collection_cache = {}
+
+def get_collection_identifier(collection_uuid):
+    """
+    Look up a collection's identifier from the Collection DynamoDB table by its UUID.
+    Maps heirarchy_path UUID -> collection table id -> identifier field.
+    Results are cached in-memory so each UUID is only fetched once per process; the cache
+    is normally filled ahead of time in batches by prefetch_page_collections.
+    Returns the identifier string, or None if not found.
+    """
+    if not collection_uuid:
+        return None
+
+    # Return cached value if already looked up
+    if collection_uuid in _collection_cache:
+        increment('collection_cache_hits')
+        return _collection_cache[collection_uuid]
+    increment('collection_cache_misses')
+
+    collection_table_name = os.getenv("COLLECTION_TABLE")
+    if not collection_table_name:
+        print("WARNING: COLLECTION_TABLE env var not set; cannot look up isPartOf")
+        _collection_cache[collection_uuid] = None
+        return None
+
+    try:
+        region = os.getenv("REGION")
+        coll_table = get_table(collection_table_name, region)
+        with timed('collection_get_item'):
+            response = coll_table.get_item(Key={"id": collection_uuid})
+        coll_item = response.get("Item")
+        if coll_item:
+            identifier = coll_item.get("identifier")
+            _collection_cache[collection_uuid] = identifier
+            return identifier
+        else:
+            print(f"WARNING: No collection found for UUID '{collection_uuid}'")
+            _collection_cache[collection_uuid] = None
+            return None
+    except Exception as e:
+        print(f"WARNING: Could not look up collection '{collection_uuid}': {e}")
+        _collection_cache[collection_uuid] = None
+        return None
+
+
+# Maximum keys per BatchGetItem request (DynamoDB limit)
+BATCH_GET_LIMIT = 100
+BATCH_GET_MAX_RETRIES = 8
+
+def prefetch_collection_identifiers(collection_uuids):
+    """
+    Resolve collection UUIDs into _collection_cache with BatchGetItem, 100 keys per request,
+    so get_collection_identifier answers from the cache instead of one GetItem per UUID.
+    UnprocessedKeys are retried with exponential backoff. UUIDs that are still unresolved
+    after the retries (or after an error) stay uncached and fall back to a single GetItem.
+    """
+    collection_table_name = os.getenv("COLLECTION_TABLE")
+    pending = [u for u in dict.fromkeys(collection_uuids) if u and u not in _collection_cache]
+    if not collection_table_name or not pending:
+        return
+
+    region = os.getenv("REGION")
+    dynamodb_coll = get_resource("dynamodb", region)
+    for start in range(0, len(pending), BATCH_GET_LIMIT):
+        chunk = pending[start:start + BATCH_GET_LIMIT]
+        request = {
+            collection_table_name: {
+                "Keys": [{"id": u} for u in chunk],
+                "ProjectionExpression": "#id, #identifier",
+                "ExpressionAttributeNames": {"#id": "id", "#identifier": "identifier"},
+            }
+        }
+        unresolved = set(chunk)
+        try:
+            attempt = 0
+            while request:
+                with timed('collection_batch_get'):
+                    response = dynamodb_coll.batch_get_item(RequestItems=request)
+                for coll_item in response.get("Responses", {}).get(collection_table_name, []):
+                    _collection_cache[coll_item["id"]] = coll_item.get("identifier")
+                    unresolved.discard(coll_item["id"])
+                request = response.get("UnprocessedKeys") or {}
+                if request:
+                    attempt += 1
+                    if attempt > BATCH_GET_MAX_RETRIES:
+                        break
+                    time.sleep(min(0.05 * 2 ** attempt, 5))
+        except Exception as e:
+            print(f"WARNING: Could not batch look up collections: {e}")
+            continue
+
+        # Keys DynamoDB processed but returned no item for do not exist in the table
+        still_unprocessed = {key["id"] for key in request.get(collection_table_name, {}).get("Keys", [])}
+        for collection_uuid in unresolved - still_unprocessed:
+            print(f"WARNING: No collection found for UUID '{collection_uuid}'")
+            _collection_cache[collection_uuid] = None
+
+def item_collection_uuids(item):
+    """Collection UUIDs build_xml looks up for an item (heirarchy_path, unless is_part_of is set)"""
+    if item.get("is_part_of"):
+        return []
+    heirarchy_path = item.get("heirarchy_path") or []
+    if isinstance(heirarchy_path, str):
+        heirarchy_path = [heirarchy_path]
+    return heirarchy_path
+
+def prefetch_page_collections(pages):
+    """
+    Before a scan page is rendered, resolve the heirarchy_path collection UUIDs of its
+    items (those without is_part_of) in batches, then yield the page unchanged.
+    """
+    for page in pages:
+        collection_uuids = []
+        for item in page:
+            collection_uuids.extend(item_collection_uuids(item))
+        prefetch_collection_identifiers(collection_uuids)
+        yield page
+
+def preload_collection_identifiers():
+    """
+    Load the whole collection table into the cache with one paginated scan (used by the
+    export service, so jobs never wait for collection lookups).
+    Returns the number of collections loaded.
+    """
+    collection_table_name = os.getenv("COLLECTION_TABLE")
+    if not collection_table_name:
+        return 0
+    try:
+        coll_table = get_table(collection_table_name, os.getenv("REGION"))
+        scan_kwargs = {
+            "ProjectionExpression": "#id, #identifier",
+            "ExpressionAttributeNames": {"#id": "id", "#identifier": "identifier"},
+        }
+        response = coll_table.scan(**scan_kwargs)
+        rows = response.get("Items", [])
+        while 'LastEvaluatedKey' in response:
+            response = coll_table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+            rows.extend(response.get("Items", []))
+    except Exception as e:
+        print(f"WARNING: Could not load collection table: {e}")
+        return 0
+    for coll_item in rows:
+        _collection_cache[coll_item["id"]] = coll_item.get("identifier")
+    return len(rows)
+
+def cached_collection_identifiers(items):
+    """The cached collection identifiers the given items need (to send to a worker process)"""
+    return {u: _collection_cache[u] for item in items
+            for u in item_collection_uuids(item) if u in _collection_cache}
+
+def cache_collection_identifiers(collection_identifiers):
+    """Add resolved collection identifiers (e.g. sent by the parent process) to the cache"""
+    _collection_cache.update(collection_identifiers)
+
+def cache_sizes():
+    """Number of language codes and collection identifiers cached in this process"""
+    return {
+        'language_codes': len(_language_codes) if _language_codes is not None else None,
+        'collections': len(_collection_cache),
+    }
+
+def clear_caches():
+    """Drop the cached language codes, collection identifiers and rights registry"""
+    global _language_codes
+    _language_codes = None
+    _collection_cache.clear()
+    use_rights_registry(None)
+
+
+def load_rights_registry_or_none():
+    """Load the rights registry, or return None (the error is reported by later lookups)"""
+    try:
+        with timed('rights_registry_load'):
+            return load_rights_registry()
+    except Exception:
+        return None
+
+def process_rights_statement(rights_uri, item_id):
+    """
+    Validate and enrich rights statement information from the RightsStatement lookup table.
+
+    Args:
+        rights_uri: The rights URI from the item metadata
+        item_id: The item identifier for logging
+
+    Returns:
+        Dictionary with:
+            - 'valid': Boolean indicating if URI is valid
+            - 'uri': The original URI
+            - 'label': The human-readable label (e.g., "No Copyright - United States")
+            - 'description': Full description text
+            - 'code': Short code (e.g., "NoC-US")
+            - 'category': Category (In Copyright, No Copyright, Other)
+            - 'error': Error message if invalid
+    """
+    result = {
+        'valid': False,
+        'uri': rights_uri,
+        'label': None,
+        'description': None,
+        'code': None,
+        'category': None,
+        'error': None
+    }
+
+    if not rights_uri:
+        result['error'] = "Rights URI is empty"
+        logging.warning(f"Item {item_id}: No rights URI provided")
+        return result
+
+    # Validate the URI
+    is_valid, code, error = validate_rights_uri(rights_uri)
+
+    if not is_valid:
+        result['error'] = error
+        logging.error(f"Item {item_id}: Invalid rights URI '{rights_uri}' - {error}")
+        return result
+
+    # Get full rights information
+    rights_info = get_rights_info(rights_uri)
+
+    if rights_info:
+        result['valid'] = True
+        result['label'] = rights_info.get('RightsLabel')
+        result['description'] = rights_info.get('RightsDescription')
+        result['code'] = rights_info.get('RightsCode')
+        result['category'] = rights_info.get('RightsCategory')
+        logging.info(f"Item {item_id}: Valid rights statement - {code}")
+    else:
+        result['error'] = "Could not retrieve rights information"
+        logging.error(f"Item {item_id}: Could not retrieve rights info for '{rights_uri}'")
+
+    return result
@@ -0,0 +1,546 @@
+"""
+Building, naming and serializing the XML record for one DynamoDB item.
+
+build_xml() turns an item into an mdRecord element tree, get_output_subdir()
+and get_file_name() decide where its file goes, and serialize_record() writes
+the exact text of the file.
+
+Per-run state (the S3 federated identifiers, the invalid rights URIs found and
+the identifier warnings file) is set by start_run() at the start of each export.
+"""
+import logging
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from export_metrics import timed
+
+from .lookups import get_iso_639_2_code, get_permalink, get_collection_identifier, process_rights_statement
+
+# Per-item output is only printed with --verbosity debug
+_debug_output = False
+# S3 federated identifiers -> S3 folder path, for the invalid rights report
+federated_identifiers = None
+# Report the invalid or empty rights URIs found by build_xml are written to (reports.InvalidRightsReport)
+_invalid_rights_report = None
+# Invalid rights entries collected by a worker process, returned to the parent with its chunk
+_invalid_rights_buffer = None
+# File the identifier warnings of the run are appended to
+_identifier_warnings_file = None
+# Identifier warnings collected by a worker process, returned to the parent with its chunk
+_identifier_warning_buffer = None
+
+def start_run(identifier_warnings_file, debug_output=False, s3_identifiers=None, invalid_rights_report=None):
+    """Reset the per-run state at the start of an export"""
+    global _debug_output, federated_identifiers, _identifier_warnings_file, _identifier_warning_buffer
+    global _invalid_rights_report, _invalid_rights_buffer
+    _debug_output = debug_output
+    federated_identifiers = s3_identifiers
+    _identifier_warnings_file = identifier_warnings_file
+    _identifier_warning_buffer = None
+    _invalid_rights_report = invalid_rights_report
+    _invalid_rights_buffer = None
+
+def end_run():
+    """Close the invalid rights report if the run stopped before closing it (marked as interrupted)"""
+    if _invalid_rights_report is not None:
+        _invalid_rights_report.close(complete=False)
+
+def debug(message):
+    """Print a per-item line (only with --verbosity debug)"""
+    if _debug_output:
+        print(message)
+
+# Namespace mapping
+NSMAP = {
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+    "rdf": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    "edm": "http://www.europeana.eu/schemas/edm/",
+    "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+    None: "http://dplava.lib.virginia.edu"
+}
+# DEBUG: Registering XML namespaces
+for prefix, uri in NSMAP.items():
+    if prefix:  # skip default namespace
+        ET.register_namespace(prefix, uri)
+        #rint(f'DEBUG: Registered namespace {prefix}: {uri}')
+
+def clean_text_for_xml(text):
+    """
+    Clean text by removing backslash escaping before XML generation.
+    ElementTree handles <, >, & escaping automatically.
+    Our serialization handles quote/apostrophe escaping with &quot; and &apos;.
+    """
+    if not text:
+        return text
+    
+    text_str = str(text)
+    
+    # Remove backslash-escaped quotes from source data
+    # DynamoDB has \"  which should become just "
+    # Then our serialization will convert " to &quot;
+    text_str = text_str.replace('\\"', '"')
+    text_str = text_str.replace("\\'", "'")
+    
+    return text_str
+
+def is_likely_date(s):
+    # Accepts YYYY-MM-DD, YYYY-MM, YYYY/MM/DD, YYYY/MM, or 4-digit year
+    s = s.strip()
+    if len(s) == 4 and s.isdigit():
+        return True
+    try:
+        datetime.strptime(s, "%Y-%m-%d")
+        return True
+    except Exception:
+        pass
+    try:
+        datetime.strptime(s, "%Y-%m")
+        return True
+    except Exception:
+        pass
+    try:
+        datetime.strptime(s, "%Y/%m/%d")
+        return True
+    except Exception:
+        pass
+    try:
+        datetime.strptime(s, "%Y/%m")
+        return True
+    except Exception:
+        pass
+    return False
+
+def build_xml(item, xml_filename=None):
+    """
+    Build XML for a single DynamoDB row.
+    xml_filename is recorded with any invalid rights URI found for the item.
+    """
+    debug(f'DEBUG: Building XML for item: {item.get("identifier", "NO IDENTIFIER FOUND")}')
+    # Create root with minimal attributes, serialize_record writes the exact root tag
+    root = ET.Element("mdRecord")
+    # Add xsi:schemaLocation attribute
+    root.set(f"{{{NSMAP['xsi']}}}schemaLocation", "http://dplava.lib.virginia.edu dplava.xsd")
+
+    # Add dcterms fields in specific order with date appearing after subject
+    # Fields before date
+    fields_before_date = [
+        "identifier", "title", "description", "language", "contributor", "subject"
+    ]
+    
+    for field in fields_before_date:
+        if field in item:
+            value = item[field]
+            if isinstance(value, list):
+                for v in value:
+                    if field == "language":
+                        v = get_iso_639_2_code(v)
+                    # Clean text to remove backslash escaping before assigning
+                    cleaned_text = clean_text_for_xml(v)
+                    ET.SubElement(root, f"{{{NSMAP['dcterms']}}}{field}").text = cleaned_text
+            else:
+                if field == "language":
+                    value = get_iso_639_2_code(value)
+                # Clean text to remove backslash escaping before assigning
+                cleaned_text = clean_text_for_xml(value)
+                ET.SubElement(root, f"{{{NSMAP['dcterms']}}}{field}").text = cleaned_text
+
+    # Add date as dcterms:date element (immediately after subject elements)
+    # Source field in DynamoDB is 'display_date' — a free-text string set by curators.
+    # Output as dcterms:date to match the original metadata.
+    date_value = item.get("display_date")
+    if date_value:
+        if isinstance(date_value, list):
+            # Join all list items with comma
+            date_value = ", ".join([str(d).strip() for d in date_value if d and str(d).strip()])
+        if date_value and isinstance(date_value, str):
+            date_value = date_value.strip()
+            if date_value:  # Only add if not empty after stripping
+                cleaned_date = clean_text_for_xml(date_value)
+                ET.SubElement(root, f"{{{NSMAP['dcterms']}}}date").text = cleaned_date
+    
+    # Fields after date
+    fields_after_date = [
+        "type", "spatial", "medium", "format"
+    ]
+    
+    for field in fields_after_date:
+        if field in item:
+            value = item[field]
+            if isinstance(value, list):
+                for v in value:
+                    # Clean text to remove backslash escaping before assigning
+                    cleaned_text = clean_text_for_xml(v)
+                    ET.SubElement(root, f"{{{NSMAP['dcterms']}}}{field}").text = cleaned_text
+            else:
+                # Clean text to remove backslash escaping before assigning
+                cleaned_text = clean_text_for_xml(value)
+                ET.SubElement(root, f"{{{NSMAP['dcterms']}}}{field}").text = cleaned_text
+
+    # Add dcterms:isPartOf
+    # Priority 1: Use is_part_of field from database if it exists
+    # Priority 2: Fall back to walking heirarchy_path UUIDs and looking up each
+    #             in the Collection table (matched on id), then emitting the identifier value.
+    # Note: field is spelled 'heirarchy_path' in DynamoDB (preserving source typo).
+    is_part_of = item.get("is_part_of")
+    
+    if is_part_of:
+        # Use the is_part_of value directly from the database
+        if isinstance(is_part_of, list):
+            for value in is_part_of:
+                if value:
+                    ET.SubElement(root, f"{{{NSMAP['dcterms']}}}isPartOf").text = clean_text_for_xml(value)
+        else:
+            ET.SubElement(root, f"{{{NSMAP['dcterms']}}}isPartOf").text = clean_text_for_xml(is_part_of)
+    else:
+        # Fall back to heirarchy_path lookup
+        heirarchy_path = item.get("heirarchy_path") or []
+        if isinstance(heirarchy_path, str):
+            heirarchy_path = [heirarchy_path]
+        for path_uuid in heirarchy_path:
+            coll_identifier = get_collection_identifier(path_uuid)
+            if coll_identifier:
+                ET.SubElement(root, f"{{{NSMAP['dcterms']}}}isPartOf").text = clean_text_for_xml(coll_identifier)
+
+    # Process rights statement with validation only (no enrichment in XML output)
+    debug(f"  → Checking for rights field...")
+    if "rights" in item:
+        rights_value = item["rights"]
+        # Handle list (take first value) or single value
+        rights_uri = rights_value[0] if isinstance(rights_value, list) and rights_value else rights_value
+        
+        if rights_uri:
+            debug(f"  → 🔍 Rights URL found: {rights_uri}")
+            
+            # Validate rights URI against RightsStatement table (using ORIGINAL URI)
+            debug(f"  → 📊 Checking RightsStatement lookup table...")
+            with timed('rights_lookup'):
+                rights_data = process_rights_statement(rights_uri, item.get("identifier", "UNKNOWN"))
+            
+            if rights_data['valid']:
+                # Valid URI - output just the URI
+                debug(f"  → ✅ VALIDATED! Found in table as: {rights_data['code']}")
+                rights_elem = ET.SubElement(root, f"{{{NSMAP['dcterms']}}}rights")
+                rights_elem.text = rights_uri
+                
+                logging.info(f"Item {item.get('identifier')}: Valid rights URI - {rights_data['code']}")
+            else:
+                # Invalid rights URI - log error and still output the URI
+                debug(f"  → ❌ VALIDATION FAILED: {rights_data['error']}")
+                logging.error(f"RIGHTS VALIDATION FAILED - Item {item.get('identifier')}: {rights_data['error']}")
+                
+                # Get S3 path from federated_identifiers (collected from S3_PREFIX)
+                identifier = item.get('identifier', 'UNKNOWN')
+                s3_path = federated_identifiers.get(identifier, 'N/A') if federated_identifiers else 'N/A'
+                
+                # Track invalid URI for summary report
+                write_invalid_rights({
+                    'item_id': item.get('identifier', 'UNKNOWN'),
+                    'identifier': identifier,
+                    'title': item.get('title', 'N/A'),
+                    'description': item.get('description', 'N/A'),
+                    'uri': rights_uri,
+                    'error': rights_data['error'],
+                    'xml_filename': xml_filename,
+                    'item_category': item.get('item_category', 'N/A'),
+                    'visibility': item.get('visibility', 'N/A'),
+                    's3_path': s3_path
+                })
+                
+                # Still add the URI to XML (for completeness) but it's been flagged in logs
+                rights_elem = ET.SubElement(root, f"{{{NSMAP['dcterms']}}}rights")
+                rights_elem.text = clean_text_for_xml(rights_uri)
+        else:
+            debug(f"  → ⚠️  Rights field exists but URI is empty")
+            
+            # Get S3 path from federated_identifiers (collected from S3_PREFIX)
+            identifier = item.get('identifier', 'UNKNOWN')
+            s3_path = federated_identifiers.get(identifier, 'N/A') if federated_identifiers else 'N/A'
+            
+            # Track empty rights field
+            write_invalid_rights({
+                'item_id': item.get('identifier', 'UNKNOWN'),
+                'identifier': identifier,
+                'title': item.get('title', 'N/A'),
+                'description': item.get('description', 'N/A'),
+                'uri': '(empty)',
+                'error': 'Rights field exists but URI is empty',
+                'xml_filename': xml_filename,
+                'item_category': item.get('item_category', 'N/A'),
+                'visibility': item.get('visibility', 'N/A'),
+                's3_path': s3_path
+            })
+    else:
+        debug(f"  → ℹ️  No 'rights' field in this item (skipping validation)")
+
+    # Always add provenance as required by DPLA
+    ET.SubElement(
+        root,
+        f"{{{NSMAP['dcterms']}}}provenance"
+    ).text = "Virginia Polytechnic Institute and State University. University Libraries"
+
+
+    # edm fields
+    # edm:isShownAt (permalink)
+    permalink = get_permalink(item)
+    if permalink:
+        ET.SubElement(root, f"{{{NSMAP['edm']}}}isShownAt").text = permalink
+
+    # edm:preview (thumbnail)
+    thumbnail_path = item.get("thumbnail_path", "")
+    if thumbnail_path:
+        ET.SubElement(root, f"{{{NSMAP['edm']}}}preview").text = thumbnail_path
+
+    # Add creator element if present
+    creator = item.get("creator")
+    if creator:
+        if isinstance(creator, list):
+            for c in creator:
+                cleaned_creator = clean_text_for_xml(c)
+                ET.SubElement(root, f"{{{NSMAP['dcterms']}}}creator").text = cleaned_creator
+        else:
+            cleaned_creator = clean_text_for_xml(creator)
+            ET.SubElement(root, f"{{{NSMAP['dcterms']}}}creator").text = cleaned_creator
+        
+    debug(f'DEBUG: Finished building XML for item: {item.get("identifier", "NO IDENTIFIER FOUND")}')
+    return root
+
+
+# Output folder routing. Adding a collection means adding a row to one of these tables.
+# 1. Collection identifiers with variable parts: (regex, folder from the matched text or None
+#    for the matched text itself). Checked first, in this order.
+OUTPUT_FOLDER_PATTERNS = [
+    # Ms collections with year_number_name pattern (e.g. Ms1992_028_Rodeck), folder starts with "Ms"
+    (r'MS\d{4}[_-]\d{3}(?:[_-][A-Za-z]+)?', lambda matched: matched.replace('MS', 'Ms', 1)),
+    # LD collections with dots (LD5655.A3.C3, LD5655.V8.T5)
+    (r'(?=LD5655)LD\d+\.[A-Z0-9]+\.[A-Z0-9]+', None),
+]
+# 2. Identifier prefix -> folder; the longest matching prefix wins
+OUTPUT_FOLDER_PREFIXES = {
+    # LJC Currie subfolders
+    "LJC_118_": "currie/currie-asia",
+    "LJC_120_": "currie/currie-asia",
+    "LJC_121_": "currie/currie-asia",
+    "LJC_135_": "currie/currie-asia",
+    "LJC_018_": "currie/currie-centralamerica",
+    "LJC_086_": "currie/currie-CINVA",
+    "LJC_019_": "currie/currie-colombia",
+    "LJC_020_": "currie/currie-egypt",
+    "LJC_021_": "currie/currie-europe",
+    "LJC_022_": "currie/currie-italy",
+    "LJC_023_": "currie/currie-japan",
+    "LJC_024_": "currie/currie-mexico",
+    "LJC_025_": "currie/currie-nepal",
+    "LJC_026_": "currie/currie-panama",
+    "LJC_027_": "currie/currie-southamerica",
+    "LJC_028_": "currie/currie-spain",
+    "LJC_029_": "currie/currie-unitedstates",
+    "LJC": "LJC_SL",
+    # Two-part collection identifiers
+    "CIDA_CPC": "CIDA_CPC", "CIDA_GHC": "CIDA_GHC", "CIDA_GSC": "CIDA_GSC", "CIDA_WSC": "CIDA_WSC",
+    "CIDA_TSC": "CIDA_TSC", "CIDA_ARC": "CIDA_ARC", "CIDA_ELP": "CIDA_ELP", "CIDA_EYC": "CIDA_EYC",
+    "FCHS_ARC": "FCHS_ARC", "FCHS_OBJ": "FCHS_OBJ", "FCHS_PHO": "FCHS_PHO",
+    "CVM_DENT": "CVM_DENT", "CEC_EEC": "CEC_EEC",
+    "MTG_MGM": "MTG_MGM", "MTG_MGN": "MTG_MGN", "TAU_ART": "TAU_ART", "VA_AM": "VA_AM",
+    # Single-part collection identifiers
+    "VTCATALOG": "VTCATALOG", "BLACKSBURG": "BLACKSBURG", "BHSST": "BHSST", "XB17J67J": "XB17J67J",
+    "NMCST": "NMCST", "SFDST": "SFDST", "LDGST": "LDGST", "VTGRAD": "VTGRAD", "PRADER": "PRADER",
+    "WSMITH": "WSMITH", "BCVST": "BCVST", "CBCST": "CBCST", "AERST": "AERST",
+    "BTR": "BTR", "CRW": "CRW", "MTG": "MTG", "SQI": "SQI", "CEC": "CEC", "CVM": "CVM",
+    "FCHS": "FCHS", "CIDA": "CIDA", "VTEC": "VTEC", "EGG": "EGG", "REY": "REY", "ITEM": "ITEM", "DH80": "DH80",
+    # Numbers
+    "699": "699",
+    "P6": "P6",
+}
+# 3. Everything else
+DEFAULT_OUTPUT_FOLDER = "other"
+
+_output_folder_router = None
+# Matched identifier prefix -> output folder
+_output_folder_cache = {}
+
+def compile_output_folder_router():
+    """
+    Compile the routing tables into one anchored regex: the patterns first, then the
+    prefixes longest first, so the first alternative that matches is the rule that applies.
+    """
+    alternatives = [f"(?P<pattern{i}>{pattern})" for i, (pattern, _) in enumerate(OUTPUT_FOLDER_PATTERNS)]
+    alternatives += [re.escape(prefix) for prefix in sorted(OUTPUT_FOLDER_PREFIXES, key=len, reverse=True)]
+    return re.compile("|".join(alternatives))
+
+def get_output_subdir(identifier):
+    """
+    Map identifier to output folder based on collection identifier pattern.
+    Uses the identifier as-is (uppercased) for folder names, extracted from patterns.
+    The routing tables above are compiled once; the folder is memoized per matched prefix.
+    Examples:
+        BTR_001 -> BTR
+        CEC_EEC_001 -> CEC_EEC
+        FCHS_ARC_001 -> FCHS_ARC
+        Ms1992_028_Rodeck_B1_F1 -> Ms1992_028_RODECK
+        LD5655.A3.C3_001 -> LD5655.A3.C3
+    """
+    global _output_folder_router
+    if _output_folder_router is None:
+        _output_folder_router = compile_output_folder_router()
+
+    match = _output_folder_router.match(identifier.upper())
+    if match is None:
+        return DEFAULT_OUTPUT_FOLDER
+    matched = match.group(0)
+    folder = _output_folder_cache.get(matched)
+    if folder is None:
+        if match.lastgroup:
+            folder_from_match = OUTPUT_FOLDER_PATTERNS[int(match.lastgroup[len("pattern"):])][1]
+            folder = folder_from_match(matched) if folder_from_match else matched
+        else:
+            folder = OUTPUT_FOLDER_PREFIXES[matched]
+        _output_folder_cache[matched] = folder
+    return folder
+
+def collect_identifier_warnings():
+    """
+    Collect identifier warnings in a list instead of writing them to the file
+    (in a worker process). Returns the list the warnings are added to.
+    """
+    global _identifier_warning_buffer
+    _identifier_warning_buffer = []
+    return _identifier_warning_buffer
+
+def collect_invalid_rights():
+    """
+    Collect invalid rights entries in a list instead of writing them to the report
+    (in a worker process). Returns the list the entries are added to.
+    """
+    global _invalid_rights_buffer
+    _invalid_rights_buffer = []
+    return _invalid_rights_buffer
+
+def write_invalid_rights(invalid_item):
+    """Write an invalid rights entry to the run's report (buffered in worker processes)"""
+    if _invalid_rights_buffer is not None:
+        _invalid_rights_buffer.append(invalid_item)
+    elif _invalid_rights_report is not None:
+        _invalid_rights_report.add(invalid_item)
+
+def invalid_rights_count():
+    """Invalid rights entries written to the run's report so far"""
+    return _invalid_rights_report.count if _invalid_rights_report is not None else 0
+
+def write_identifier_warning(warning_msg):
+    """Append a warning to the identifier warnings file (buffered in worker processes)"""
+    if _identifier_warning_buffer is not None:
+        _identifier_warning_buffer.append(warning_msg)
+        return
+    with open(_identifier_warnings_file, 'a', encoding='utf-8') as f:
+        f.write(warning_msg)
+
+def get_file_name(item, idx):
+    """
+    Determine the XML filename for an item: other_identifier, falling back to
+    identifier, then to a generated item_<n> name. Fallbacks and multiple
+    other_identifier values are logged to the identifier warnings file.
+    """
+    # Use other_identifier for file naming, fallback to identifier if not available
+    other_id = item.get("other_identifier")
+    identifier_value = item.get("identifier")
+    
+    # Determine which identifier to use and log if using fallback
+    if other_id:
+        file_identifier = other_id
+    elif identifier_value:
+        # Fallback to identifier field
+        file_identifier = identifier_value
+        warning_msg = (
+            f"INFO: Item missing other_identifier, using 'identifier' field as fallback\n"
+            f"  identifier: {identifier_value}\n"
+            f"  Using for filename: {identifier_value}\n"
+            f"  title: {item.get('title', 'N/A')}\n"
+            f"  {'-'*60}\n"
+        )
+        debug(warning_msg)
+        write_identifier_warning(warning_msg)
+    else:
+        # Final fallback to item number
+        file_identifier = f"item_{idx+1}"
+        warning_msg = (
+            f"WARNING: Item missing both other_identifier AND identifier, using generated name\n"
+            f"  Generated filename: item_{idx+1}\n"
+            f"  title: {item.get('title', 'N/A')}\n"
+            f"  {'-'*60}\n"
+        )
+        debug(warning_msg)
+        write_identifier_warning(warning_msg)
+    
+    # Handle case where other_identifier might be a list
+    if isinstance(file_identifier, list):
+        # Check if there are multiple identifiers and log warning
+        if len(file_identifier) > 1:
+            warning_msg = (
+                f"WARNING: Item has multiple other_identifiers\n"
+                f"  identifier: {item.get('identifier', 'N/A')}\n"
+                f"  other_identifier values: {file_identifier}\n"
+                f"  Using first value: {file_identifier[0]}\n"
+                f"  title: {item.get('title', 'N/A')}\n"
+                f"  {'-'*60}\n"
+            )
+            debug(warning_msg)
+            # Write to warning file
+            write_identifier_warning(warning_msg)
+        
+        file_identifier = file_identifier[0] if file_identifier else f"item_{idx+1}"
+    
+    debug(f'DEBUG: File identifier (for filename): {file_identifier}')
+    return file_identifier + ".xml"
+
+# Exact mdRecord opening tag written at the top of every record
+MDRECORD_ROOT_TAG = (
+    '<mdRecord xmlns:dc="http://purl.org/dc/elements/1.1/"\n'
+    '    xmlns:dcterms="http://purl.org/dc/terms/"\n'
+    '    xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"\n'
+    '    xmlns:edm="http://www.europeana.eu/schemas/edm/"\n'
+    '    xmlns="http://dplava.lib.virginia.edu"\n'
+    '    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"\n'
+    '    xsi:schemaLocation="http://dplava.lib.virginia.edu dplava.xsd">'
+)
+
+# Namespace URI -> prefix, for writing tags like dcterms:title
+NS_PREFIXES = {uri: prefix for prefix, uri in NSMAP.items() if prefix}
+_qualified_tags = {}
+
+def qualified_tag(tag):
+    """Convert an ElementTree tag ({namespace}name) to its prefixed name (prefix:name)."""
+    name = _qualified_tags.get(tag)
+    if name is None:
+        if tag[:1] == "{":
+            uri, local = tag[1:].split("}", 1)
+            name = f"{NS_PREFIXES[uri]}:{local}"
+        else:
+            name = tag
+        _qualified_tags[tag] = name
+    return name
+
+def escape_xml_text(text):
+    """
+    Escape element text in one pass: &, < and > (as ElementTree does)
+    plus " and ' as &quot; and &apos;.
+    """
+    return (text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            .replace('"', "&quot;").replace("'", "&apos;"))
+
+def serialize_record(root_elem):
+    """
+    Serialize an mdRecord built by build_xml: the exact root opening tag, then each
+    child element on its own line indented by four spaces, then the closing tag.
+    Text is escaped once per element as it is written.
+    """
+    parts = [MDRECORD_ROOT_TAG, "\n"]
+    for elem in root_elem:
+        tag = qualified_tag(elem.tag)
+        if elem.text:
+            parts.append(f"\n    <{tag}>{escape_xml_text(elem.text)}</{tag}>")
+        else:
+            parts.append(f"\n    <{tag} />")
+    parts.append("\n</mdRecord>")
+    return "".join(parts)
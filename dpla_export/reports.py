@@ -0,0 +1,110 @@
+"""
+Invalid rights URIs report, streamed while the export runs.
+
+Each invalid or empty rights URI found by build_xml is written to the text report
+and to the CSV file with corrections as soon as it is found (in scan order), so only
+the entry being written is held in memory and a run that stops partway still leaves
+the entries found so far. The files are created with the first entry; a run without
+invalid rights URIs writes no report. The text report's footer, with the total, is
+written when the report is closed.
+"""
+import csv
+import os
+from datetime import datetime
+
+from validate_rights_uri import correct_rights_uri
+
+CSV_FIELDS = ['Identifier', 'S3 Path', 'Description', 'Title', 'URI (before correction)', 'URI (after correction)']
+
+def join_values(value):
+    """Description or title as one string (lists joined with '; ')"""
+    if isinstance(value, list):
+        return '; '.join([str(v) for v in value if v])
+    return value
+
+class InvalidRightsReport:
+    """The run's invalid rights URIs, as a text report and a CSV file with corrections"""
+
+    def __init__(self, report_file, csv_file):
+        self.report_file = report_file
+        self.csv_file = csv_file
+        self.count = 0
+        self.s3_prefix = os.getenv("S3_PREFIX")
+        self._text = None
+        self._csv = None
+        self._csv_writer = None
+
+    def _open(self):
+        self._text = open(self.report_file, 'w', encoding='utf-8')
+        f = self._text
+        if self.s3_prefix:
+            f.write("INVALID RIGHTS URIS REPORT (FILTERED: S3_PREFIX + VISIBILITY)\n")
+        else:
+            f.write("INVALID RIGHTS URIS REPORT (FILTERED: VISIBILITY ONLY)\n")
+        f.write("=" * 80 + "\n")
+        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        if self.s3_prefix:
+            f.write(f"Filter Applied: S3_PREFIX='{self.s3_prefix}' AND visibility=True\n")
+        else:
+            f.write("Filter Applied: visibility=True (no S3 filtering)\n")
+        f.write(f"S3_PREFIX: {self.s3_prefix if self.s3_prefix else 'Not set'}\n")
+        f.write("Total Invalid URIs Found: see the end of the report (missing if the run was interrupted)\n")
+        f.write("=" * 80 + "\n\n")
+
+        self._csv = open(self.csv_file, 'w', encoding='utf-8', newline='')
+        self._csv_writer = csv.DictWriter(self._csv, fieldnames=CSV_FIELDS)
+        self._csv_writer.writeheader()
+
+    def add(self, invalid_item):
+        """Write one invalid rights entry (as built by build_xml) to both files"""
+        if self._text is None:
+            self._open()
+        self.count += 1
+        f = self._text
+        f.write(f"{self.count}. Item ID: {invalid_item['item_id']}\n")
+        f.write(f"   XML File: {invalid_item['xml_filename']}\n")
+        f.write(f"   Identifier: {invalid_item.get('identifier', 'N/A')}\n")
+        f.write(f"   Title: {invalid_item.get('title', 'N/A')}\n")
+        f.write(f"   Description: {invalid_item.get('description', 'N/A')}\n")
+        f.write(f"   item_category: {invalid_item.get('item_category', 'N/A')}\n")
+        f.write(f"   visibility: {invalid_item.get('visibility', 'N/A')}\n")
+        f.write(f"   S3_PREFIX: {self.s3_prefix if self.s3_prefix else 'Not set'}\n")
+        f.write(f"   URI: {invalid_item['uri']}\n")
+        f.write(f"   Error: {invalid_item['error']}\n")
+        f.write("\n")
+
+        original_uri = invalid_item.get('uri', '')
+        self._csv_writer.writerow({
+            'Identifier': invalid_item.get('identifier', 'N/A'),
+            'S3 Path': invalid_item.get('s3_path', 'N/A'),
+            'Description': join_values(invalid_item.get('description', 'N/A')),
+            'Title': join_values(invalid_item.get('title', 'N/A')),
+            'URI (before correction)': original_uri,
+            'URI (after correction)': correct_rights_uri(original_uri)
+        })
+        # Entries found so far stay readable if the run stops
+        f.flush()
+        self._csv.flush()
+
+    def close(self, complete=True):
+        """
+        Write the footer (the total and next steps; a note instead if the run did not
+        complete) and close the files. Does nothing once closed.
+        """
+        if self._text is None:
+            return
+        f = self._text
+        f.write("=" * 80 + "\n")
+        if complete:
+            f.write(f"Total Invalid URIs Found: {self.count}\n")
+        else:
+            f.write(f"RUN INTERRUPTED: {self.count} invalid URIs found before it stopped\n")
+        f.write("=" * 80 + "\n")
+        f.write("NEXT STEPS:\n")
+        f.write("- Review each invalid URI\n")
+        f.write("- Check for typos or incorrect formatting\n")
+        f.write("- Update items in DynamoDB with correct rights URIs\n")
+        f.write("- Valid URIs are listed at: https://rightsstatements.org/page/1.0/\n")
+        f.close()
+        self._csv.close()
+        self._text = self._csv = self._csv_writer = None
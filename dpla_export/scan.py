@@ -0,0 +1,347 @@
+"""
+The scan side of the export pipeline: the S3 federated identifiers, the DynamoDB
+scan (sequential or in parallel segments) and the per-page filters.
+
+Items stream through scan page -> filters -> build_xml -> write, so memory stays
+bounded by the scan page size rather than the table size.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from aws_clients import get_client, get_resource, get_table
+from export_metrics import timed
+
+from .lookups import BATCH_GET_LIMIT, BATCH_GET_MAX_RETRIES
+
+# Most values a DynamoDB IN condition accepts
+MAX_IN_VALUES = 100
+# Identifier index queries run in parallel when exporting a list of identifiers
+IDENTIFIER_QUERY_THREADS = 16
+
+# Function to get federated identifiers from S3 (for filtering)
+def get_federated_identifiers_from_s3(region=None):
+    """
+    Read S3 bucket with S3_PREFIX and extract identifiers from object keys.
+    Returns a dict mapping identifier to actual S3 folder path.
+    Only used when S3_PREFIX filtering is enabled.
+    """
+    s3_bucket = os.getenv("S3_BUCKET")
+    s3_prefix = os.getenv("S3_PREFIX")
+    
+    if not s3_bucket or not s3_prefix:
+        print("DEBUG: S3_BUCKET or S3_PREFIX not set, skipping S3 filtering")
+        return None
+    
+    print(f'DEBUG: Reading S3 bucket "{s3_bucket}" with prefix "{s3_prefix}"...')
+    
+    try:
+        s3_client = get_client('s3', region)
+        paginator = s3_client.get_paginator('list_objects_v2')
+        
+        federated_identifiers = {}  # Map identifier -> S3 folder path
+        object_count = 0
+        
+        for page in paginator.paginate(Bucket=s3_bucket, Prefix=s3_prefix):
+            for obj in page.get('Contents', []):
+                object_count += 1
+                key = obj['Key']
+                
+                # Remove the prefix to get the relative path
+                relative_key = key[len(s3_prefix):] if key.startswith(s3_prefix) else key
+                
+                if not relative_key or not '/' in relative_key:
+                    continue
+                
+                # Extract identifier from folder structure
+                # Expected structure: top_folder/identifier_folder/Access/files
+                path_parts = relative_key.split('/')
+                
+                if len(path_parts) >= 3 and 'Access' in path_parts:
+                    access_index = path_parts.index('Access')
+                    if access_index > 0:
+                        # The folder right before 'Access' is the identifier
+                        identifier = path_parts[access_index - 1]
+                        if identifier:
+                            # Store the actual S3 folder path for this identifier
+                            s3_folder_path = f"s3://{s3_bucket}/{s3_prefix}{'/'.join(path_parts[:access_index])}/"
+                            federated_identifiers[identifier] = s3_folder_path
+        
+        print(f'DEBUG: Found {object_count} S3 objects in prefix "{s3_prefix}"')
+        print(f'DEBUG: Extracted {len(federated_identifiers)} unique identifiers from S3')
+        
+        if federated_identifiers:
+            sample = list(federated_identifiers.keys())[:5]
+            print(f'DEBUG: Sample identifiers from S3: {sample}')
+        
+        return federated_identifiers
+        
+    except Exception as e:
+        print(f'ERROR: Failed to read S3 bucket: {e}')
+        print(f'       Continuing without S3 filtering...')
+        return None
+
+
+# Item attributes read by build_xml, the filename logic and the invalid rights report.
+# Only these are requested from DynamoDB (ProjectionExpression).
+EXPORT_ATTRIBUTES = [
+    "identifier", "other_identifier", "title", "description", "language", "contributor",
+    "subject", "display_date", "type", "spatial", "medium", "format", "is_part_of",
+    "heirarchy_path", "rights", "custom_key", "thumbnail_path", "creator",
+    "item_category", "visibility", "updatedAt", "createdAt"
+]
+
+def export_projection():
+    """ProjectionExpression and ExpressionAttributeNames that request only EXPORT_ATTRIBUTES"""
+    # Placeholders avoid clashes with DynamoDB reserved words (type, format, language, ...)
+    attribute_names = {f"#f{i}": name for i, name in enumerate(EXPORT_ATTRIBUTES)}
+    return {
+        "ProjectionExpression": ", ".join(attribute_names),
+        "ExpressionAttributeNames": attribute_names,
+    }
+
+def build_scan_kwargs(modified_since=None, page_size=None, identifiers=None):
+    """
+    Build the scan parameters that push the visibility filter into DynamoDB
+    (FilterExpression) and limit the returned attributes (ProjectionExpression).
+    The identifier prefix is not pushed down: it is matched ignoring case (identifiers
+    such as VTCatalog_1901 are mixed case) and DynamoDB can only compare case-sensitively,
+    so it is applied by filter_items alone.
+    A list of identifiers is pushed down as an IN condition if it has at most 100 values
+    (the DynamoDB limit); longer lists are only filtered in Python.
+    If modified_since is set, only items with a later updatedAt (or createdAt, for items
+    never updated) are returned. Hidden items are returned too in that case, so records
+    flipped to visibility=False can be pruned (the Python visibility filter still applies).
+    page_size (items evaluated per page) is passed as Limit if set.
+    """
+    filter_expression = None if modified_since else Attr("visibility").eq(True)
+    if identifiers and len(identifiers) <= MAX_IN_VALUES:
+        identifiers_condition = Attr("identifier").is_in(sorted(identifiers))
+        filter_expression = identifiers_condition if filter_expression is None else filter_expression & identifiers_condition
+    if modified_since:
+        modified_condition = (Attr("updatedAt").gt(modified_since)
+                              | (Attr("updatedAt").not_exists() & Attr("createdAt").gt(modified_since)))
+        filter_expression = modified_condition if filter_expression is None else filter_expression & modified_condition
+
+    scan_kwargs = dict(export_projection(), FilterExpression=filter_expression)
+    if page_size:
+        scan_kwargs["Limit"] = page_size
+    return scan_kwargs
+
+def scan_table_pages(table, scan_kwargs):
+    """
+    Scan a DynamoDB table (or one segment of it), following LastEvaluatedKey pagination.
+    Yields one list of items per scan page.
+    """
+    with timed('dynamodb_scan'):
+        response = table.scan(**scan_kwargs)
+    yield response.get("Items", [])
+    while 'LastEvaluatedKey' in response:
+        with timed('dynamodb_scan'):
+            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+        yield response.get("Items", [])
+
+def parallel_scan_pages(table_name, region, total_segments, scan_kwargs):
+    """
+    Scan a DynamoDB table with total_segments worker threads, one per segment.
+    Each scan thread gets its own DynamoDB resource from aws_clients.
+    Pages are yielded in segment order (all of segment 1, then segment 2, ...), so
+    a run exports items in the same order whatever order the segments finish in.
+    Each segment has its own bounded queue: the later segments are fetched at most
+    a few pages ahead of the consumer while the current one is read.
+    """
+    page_queues = [queue.Queue(maxsize=2) for _ in range(total_segments)]
+    stop = threading.Event()
+
+    def put(segment, obj):
+        while not stop.is_set():
+            try:
+                page_queues[segment].put(obj, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        try:
+            segment_table = get_table(table_name, region)
+            segment_kwargs = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+            for page in scan_table_pages(segment_table, segment_kwargs):
+                if not put(segment, page):
+                    return
+        except Exception as e:
+            put(segment, e)
+        finally:
+            put(segment, None)
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        try:
+            for segment in range(total_segments):
+                executor.submit(scan_segment, segment)
+            for segment in range(total_segments):
+                segment_count = 0
+                while True:
+                    page = page_queues[segment].get()
+                    if page is None:
+                        break
+                    if isinstance(page, Exception):
+                        raise page
+                    segment_count += len(page)
+                    yield page
+                print(f'DEBUG: Segment {segment + 1}/{total_segments} retrieved {segment_count} items')
+        finally:
+            # Unblock any scan threads still waiting on a full queue
+            stop.set()
+
+def scan_items(table_name, region, total_segments, scan_kwargs, stats):
+    """
+    Yield scan pages from DynamoDB, sequentially or in parallel segments.
+    A scan failure is reported and ends the stream; stats['scan_error'] records it.
+    """
+    try:
+        if total_segments > 1:
+            print(f'DEBUG: Scanning DynamoDB table for items ({total_segments} parallel segments)...')
+            pages = parallel_scan_pages(table_name, region, total_segments, scan_kwargs)
+        else:
+            print('DEBUG: Scanning DynamoDB table for items (with pagination)...')
+            pages = scan_table_pages(get_table(table_name, region), scan_kwargs)
+        for page in pages:
+            stats['pages'] += 1
+            stats['scanned'] += len(page)
+            for item in page:
+                modified = item.get('updatedAt') or item.get('createdAt')
+                if isinstance(modified, str) and (stats['max_modified'] is None or modified > stats['max_modified']):
+                    stats['max_modified'] = modified
+            print(f'DEBUG: Retrieved {len(page)} items from scan page {stats["pages"]}. Total so far: {stats["scanned"]}')
+            yield page
+        print(f'DEBUG: Total items retrieved from DynamoDB: {stats["scanned"]}')
+    except Exception as e:
+        print(f'ERROR: Failed to scan DynamoDB table: {e}')
+        stats['scan_error'] = str(e)
+
+def query_identifier_keys(table_name, region, index_name, identifiers):
+    """
+    Look up the table keys of the items with the given identifiers on a global secondary
+    index whose partition key is identifier (one Query per identifier, run in parallel).
+    Returns (list of table keys, identifiers with no item). Query errors are raised.
+    """
+    key_names = [key['AttributeName'] for key in get_table(table_name, region).key_schema]
+
+    def query_identifier(identifier):
+        table = get_table(table_name, region)
+        query_kwargs = {"IndexName": index_name, "KeyConditionExpression": Key("identifier").eq(identifier)}
+        keys = []
+        while True:
+            with timed('identifier_query'):
+                response = table.query(**query_kwargs)
+            keys.extend({name: item[name] for name in key_names} for item in response.get("Items", []))
+            if 'LastEvaluatedKey' not in response:
+                return keys
+            query_kwargs["ExclusiveStartKey"] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=min(IDENTIFIER_QUERY_THREADS, len(identifiers))) as executor:
+        results = list(executor.map(query_identifier, identifiers))
+    keys = []
+    not_found = []
+    for identifier, identifier_keys in zip(identifiers, results):
+        keys.extend(identifier_keys)
+        if not identifier_keys:
+            not_found.append(identifier)
+    return keys, not_found
+
+def batch_get_item_pages(table_name, region, keys):
+    """
+    Fetch items by table key with BatchGetItem, 100 keys per request, requesting only
+    EXPORT_ATTRIBUTES. UnprocessedKeys are retried with exponential backoff.
+    Yields one list of items per request, sorted by identifier.
+    """
+    dynamodb = get_resource("dynamodb", region)
+    for start in range(0, len(keys), BATCH_GET_LIMIT):
+        request = {table_name: dict(export_projection(), Keys=keys[start:start + BATCH_GET_LIMIT])}
+        page = []
+        attempt = 0
+        while request:
+            with timed('batch_get_items'):
+                response = dynamodb.batch_get_item(RequestItems=request)
+            page.extend(response.get("Responses", {}).get(table_name, []))
+            request = response.get("UnprocessedKeys") or {}
+            if request:
+                attempt += 1
+                if attempt > BATCH_GET_MAX_RETRIES:
+                    raise RuntimeError(f"{len(request[table_name]['Keys'])} items still unprocessed "
+                                       f"after {BATCH_GET_MAX_RETRIES} retries")
+                time.sleep(min(0.05 * 2 ** attempt, 5))
+        page.sort(key=lambda item: str(item.get("identifier", "")))
+        yield page
+
+def identifier_items(table_name, region, index_name, identifiers, total_segments, scan_kwargs, stats):
+    """
+    Yield pages of the items with the given identifiers, without scanning the table:
+    their keys are looked up on the identifier index (index_name) and the items are
+    fetched with BatchGetItem. Without an index, or if it cannot be queried, the table
+    is scanned with scan_kwargs instead. Identifiers with no item are kept in
+    stats['not_found']; a fetch failure is reported and recorded in stats['scan_error'].
+    """
+    identifiers = sorted(identifiers)
+    if not index_name:
+        yield from scan_items(table_name, region, total_segments, scan_kwargs, stats)
+        return
+    try:
+        print(f'DEBUG: Looking up {len(identifiers)} identifiers on index {index_name}...')
+        keys, stats['not_found'] = query_identifier_keys(table_name, region, index_name, identifiers)
+    except Exception as e:
+        print(f'WARNING: Could not query index {index_name} ({e}), scanning the table instead')
+        yield from scan_items(table_name, region, total_segments, scan_kwargs, stats)
+        return
+    if stats['not_found']:
+        print(f'WARNING: No item found for {len(stats["not_found"])} identifiers: {stats["not_found"][:20]}'
+              f'{" ..." if len(stats["not_found"]) > 20 else ""}')
+    try:
+        for page in batch_get_item_pages(table_name, region, keys):
+            stats['pages'] += 1
+            stats['scanned'] += len(page)
+            print(f'DEBUG: Retrieved {len(page)} items with BatchGetItem. Total so far: {stats["scanned"]}')
+            yield page
+    except Exception as e:
+        print(f'ERROR: Failed to fetch items from DynamoDB: {e}')
+        stats['scan_error'] = str(e)
+
+def matches_identifier_prefix(identifier, prefix):
+    """
+    Whether an identifier starts with the identifier prefix, ignoring case. Used by
+    filter_items and by manifest pruning, so a prefix run only prunes what it could export.
+    """
+    return identifier.upper().startswith(prefix.upper())
+
+def filter_items(pages, stats, filter_prefix=None, federated_identifiers=None, identifiers=None):
+    """
+    Apply the identifier list, identifier prefix, S3 federated and visibility filters to each scan page.
+    Yields the filtered list for each page and counts exclusions in stats.
+    Identifiers excluded as not visible are kept in stats['hidden'] for manifest pruning.
+    """
+    for page in pages:
+        with timed('filter'):
+            kept = []
+            for item in page:
+                # Filter by the list of identifiers if specified
+                if identifiers is not None and item.get("identifier") not in identifiers:
+                    stats['excluded_identifiers'] += 1
+                # Filter by identifier prefix if specified
+                elif filter_prefix and not matches_identifier_prefix(item.get("identifier", ""), filter_prefix):
+                    stats['excluded_prefix'] += 1
+                # FEDERATED FILTERING: Filter by S3 identifiers
+                elif federated_identifiers and item.get('identifier') not in federated_identifiers:
+                    stats['excluded_s3'] += 1
+                # VISIBILITY FILTERING: Only process items with visibility=True
+                elif item.get('visibility') != True:
+                    stats['excluded_visibility'] += 1
+                    if item.get('identifier'):
+                        stats['hidden'].add(item['identifier'])
+                else:
+                    kept.append(item)
+            stats['kept'] += len(kept)
+        yield kept
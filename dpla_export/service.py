@@ -0,0 +1,168 @@
+"""
+Long-running export service with warm caches.
+
+A one-off export starts cold: it imports boto3, connects and reloads the rights
+statements, language codes and collections. The service loads them once and
+keeps them (and the AWS connection pools) for every later job, so a curator's
+re-export of one collection or a few records does not pay that cost again.
+
+Jobs run one at a time, each as a normal export (main()) with its own logs and
+reports in logs/. The settings come from the environment, as for the script.
+
+Endpoints (JSON, on 127.0.0.1 by default; no authentication, keep it local):
+  GET  /status   cache sizes and number of jobs run
+  POST /export   {"identifier_prefix": "SQI"} or {"identifiers": ["SQI_PO_00001", ...]}
+                 optional "verbosity": "quiet" (default), "progress" or "debug"
+                 returns {"ok": true, "summary": {...}, "output": "..."}
+  POST /reload   drop the cached lookups and load them again
+
+Usage:
+  python -m dpla_export.service [--host 127.0.0.1] [--port 8765]
+  curl -s -X POST localhost:8765/export -d '{"identifier_prefix": "SQI"}'
+
+Configuration from environment variables:
+  EXPORT_SERVICE_HOST   Address to listen on (default 127.0.0.1)
+  EXPORT_SERVICE_PORT   Port to listen on (default 8765)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+import traceback
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from aws_clients import get_table
+
+from .exporter import main as run_export_main
+from .lookups import (get_language_codes, load_rights_registry_or_none, preload_collection_identifiers,
+                      cache_sizes, clear_caches)
+
+_service_state = {'started': None, 'jobs': 0}
+
+def warm_caches():
+    """Load the lookup tables and connect to the items table before the first job"""
+    started = time.perf_counter()
+    get_language_codes()
+    load_rights_registry_or_none()
+    collections = preload_collection_identifiers()
+    get_table(os.getenv("DYNAMODB_TABLE"), os.getenv("REGION"))
+    print(f'DEBUG: Caches warmed in {time.perf_counter() - started:.2f}s '
+          f'({len(get_language_codes())} language codes, {collections} collections)')
+
+def job_argv(job):
+    """
+    Command line options for an export job.
+
+    Raises:
+        ValueError: If the job does not name an identifier prefix or identifiers,
+            or a value would be read as a command line option
+    """
+    if not isinstance(job, dict):
+        raise ValueError("job must be a JSON object")
+    identifier_prefix = job.get("identifier_prefix")
+    identifiers = job.get("identifiers")
+    if not identifier_prefix and not identifiers:
+        raise ValueError("job needs identifier_prefix or identifiers")
+    if identifiers is not None and (not isinstance(identifiers, list)
+                                    or not all(isinstance(i, str) and i for i in identifiers)):
+        raise ValueError("identifiers must be a list of identifier strings")
+    if identifier_prefix and (not isinstance(identifier_prefix, str) or identifier_prefix.startswith("-")):
+        raise ValueError("identifier_prefix must be a string not starting with '-'")
+    if identifiers and any(i.startswith("-") for i in identifiers):
+        raise ValueError("identifiers must not start with '-'")
+    verbosity = job.get("verbosity", "quiet")
+    if verbosity not in ("quiet", "progress", "debug"):
+        raise ValueError("verbosity must be quiet, progress or debug")
+    argv = ["--verbosity", verbosity]
+    if identifier_prefix:
+        argv += ["--identifier-prefix", identifier_prefix]
+    if identifiers:
+        argv += ["--identifiers"] + identifiers
+    return argv
+
+def run_job(job):
+    """
+    Run one export job in this process, with its console output captured.
+    Returns the response for the client.
+    """
+    argv = job_argv(job)
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        summary = run_export_main(argv)
+    _service_state['jobs'] += 1
+    print(f"DEBUG: Job {_service_state['jobs']} ({' '.join(argv[2:])}): "
+          f"{summary['items']['exported']} items exported in {time.perf_counter() - started:.2f}s", flush=True)
+    return {'ok': True, 'summary': summary, 'output': output.getvalue()}
+
+class ExportRequestHandler(BaseHTTPRequestHandler):
+    """Handles the service's JSON endpoints (one request at a time)"""
+
+    def send_json(self, status, body):
+        data = json.dumps(body, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/status':
+            self.send_json(404, {'ok': False, 'error': f'unknown endpoint {self.path}'})
+            return
+        self.send_json(200, {
+            'ok': True,
+            'uptime_seconds': round(time.time() - _service_state['started'], 1),
+            'jobs': _service_state['jobs'],
+            'cached': cache_sizes(),
+        })
+
+    def do_POST(self):
+        if self.path == '/reload':
+            clear_caches()
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                warm_caches()
+            self.send_json(200, {'ok': True, 'cached': cache_sizes(), 'output': output.getvalue()})
+            return
+        if self.path != '/export':
+            self.send_json(404, {'ok': False, 'error': f'unknown endpoint {self.path}'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            job = json.loads(self.rfile.read(length) or b'{}')
+            job_argv(job)
+        except ValueError as e:
+            self.send_json(400, {'ok': False, 'error': str(e)})
+            return
+        try:
+            self.send_json(200, run_job(job))
+        except SystemExit as e:
+            # argparse ends main() with SystemExit on an option it rejects; the service keeps running
+            print(f'ERROR: Export job exited: {e.code}')
+            self.send_json(500, {'ok': False, 'error': f'export exited with status {e.code}'})
+        except Exception as e:
+            print(f'ERROR: Export job failed: {e}')
+            traceback.print_exc()
+            self.send_json(500, {'ok': False, 'error': str(e)})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dpla_export.service", description="Export service with warm caches")
+    parser.add_argument("--host", default=os.getenv("EXPORT_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("EXPORT_SERVICE_PORT", "8765")))
+    args = parser.parse_args(argv)
+
+    warm_caches()
+    _service_state['started'] = time.time()
+    server = HTTPServer((args.host, args.port), ExportRequestHandler)
+    print(f'DEBUG: Export service listening on http://{args.host}:{server.server_port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
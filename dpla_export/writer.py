@@ -0,0 +1,156 @@
+"""
+Writing exported XML files and removing the ones that are no longer exported.
+
+Paths in the manifest are relative to the export output directory
+(e.g. SQI/SQI_PO_00001.xml).
+"""
+import contextlib
+import hashlib
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from export_metrics import increment
+
+def content_hash(data):
+    """SHA-256 hex digest of a record's encoded XML."""
+    return hashlib.sha256(data).hexdigest()
+
+class RecordWriter:
+    """
+    Writes the exported XML files of one run.
+    - each output directory is created once; later records in it skip the makedirs call
+    - with threads > 0, writes are queued on a bounded pool of threads (write-behind)
+      while the next records are rendered; results come back in the order submitted
+    - with atomic set, a file is written to a hidden temp file next to it and renamed
+      over it, so a crashed run never leaves a half-written XML file behind
+    - with write_files unset nothing is written (runs that only write bundles); records
+      are still hashed and reported as added
+    """
+
+    def __init__(self, incremental=False, atomic=True, threads=0, write_files=True):
+        self.incremental = incremental
+        self.atomic = atomic
+        self.write_files = write_files
+        self.threads = threads
+        self._created_dirs = set()
+        self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 0 else None
+        self._pending = deque()
+        # Writes queued beyond this wait for the oldest one, bounding the rendered records held in memory
+        self._max_pending = threads * 4
+
+    def make_dir(self, output_dir):
+        """Create an output directory unless this writer already did"""
+        if self.write_files and output_dir not in self._created_dirs:
+            os.makedirs(output_dir, exist_ok=True)
+            self._created_dirs.add(output_dir)
+
+    def write_file(self, file_path, xml_str, known_hash=None):
+        """
+        Write a rendered record to disk. In incremental mode the content hash is compared
+        with the existing file first and unchanged files are not rewritten. known_hash is
+        the manifest's hash for this file; when it matches (and the size agrees) the
+        existing file is not read at all.
+        Returns (outcome, content hash), outcome being added, changed or unchanged.
+        """
+        data = xml_str.encode('utf-8')
+        data_hash = content_hash(data)
+        if not self.write_files:
+            return 'added', data_hash
+        exists = os.path.exists(file_path)
+        if self.incremental and exists:
+            if known_hash == data_hash and os.path.getsize(file_path) == len(data):
+                unchanged = True
+            else:
+                with open(file_path, 'rb') as f:
+                    unchanged = content_hash(f.read()) == data_hash
+            if unchanged:
+                return 'unchanged', data_hash
+        outcome = 'changed' if exists else 'added'
+        if self.atomic:
+            directory, file_name = os.path.split(file_path)
+            temp_path = os.path.join(directory, f'.{file_name}.{os.getpid()}-{threading.get_ident()}.tmp')
+            try:
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, file_path)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    os.remove(temp_path)
+                raise
+        else:
+            with open(file_path, 'wb') as f:
+                f.write(data)
+        increment('bytes_written', len(data))
+        return outcome, data_hash
+
+    def submit(self, tag, write, *args):
+        """
+        Run write(*args) for one record, on the pool when there is one.
+        Returns the (tag, result) pairs of the writes that have finished, in the order
+        they were submitted (waiting for the oldest when the queue is full).
+        """
+        if self._pool is None:
+            return [(tag, write(*args))]
+        self._pending.append((tag, self._pool.submit(write, *args)))
+        done = []
+        while self._pending and (len(self._pending) > self._max_pending or self._pending[0][1].done()):
+            tag, future = self._pending.popleft()
+            done.append((tag, future.result()))
+        return done
+
+    def drain(self):
+        """Wait for the queued writes. Returns their (tag, result) pairs in the order submitted."""
+        done = []
+        while self._pending:
+            tag, future = self._pending.popleft()
+            done.append((tag, future.result()))
+        return done
+
+    def close(self):
+        """Wait for the queued writes and stop the pool"""
+        self._pending.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+def remove_output_file(output_base_dir, relative_path, reason):
+    """Delete an exported XML file (path relative to the output directory) if it exists."""
+    file_path = os.path.join(output_base_dir, relative_path)
+    if not os.path.exists(file_path):
+        return False
+    os.remove(file_path)
+    print(f'DEBUG: Deleted {reason} XML file: {file_path}')
+    return True
+
+def prune_manifest_orphans(output_base_dir, manifest, run_id, in_scope):
+    """
+    Delete the files of manifest entries that are in scope for this run but were not
+    exported by it (deleted or hidden records), and drop those entries.
+    Returns the number of files deleted.
+    """
+    deleted = 0
+    for key in sorted(manifest):
+        entry = manifest[key]
+        if entry['last_seen'] == run_id or not in_scope(key):
+            continue
+        if remove_output_file(output_base_dir, entry['path'], 'orphaned'):
+            deleted += 1
+        del manifest[key]
+    return deleted
+
+def prune_stale_files(output_dirs, exported_paths):
+    """
+    Delete .xml files in the given output directories that this run did not export.
+    Only used the first time a manifest is built, to clear files exported before it existed.
+    Returns the number of files deleted.
+    """
+    deleted = 0
+    for output_dir in sorted(output_dirs):
+        for entry in os.scandir(output_dir):
+            if entry.is_file() and entry.name.endswith('.xml') and entry.path not in exported_paths:
+                os.remove(entry.path)
+                print(f'DEBUG: Deleted stale XML file: {entry.path}')
+                deleted += 1
+    return deleted
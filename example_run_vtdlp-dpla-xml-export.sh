@@ -11,10 +11,48 @@ export S3_BUCKET="<FILL-IN-S3_BUCKET>"
 export S3_PREFIX="<FILL-IN-S3_PREFIX>"
 # Folder lookup table in DynamoDB
 export FOLDER_LOOKUP_TABLE="<FILL-IN-FOLDER_LOOKUP_TABLE>"
-# Set the identifier for which xml export is to be run
+# Set the identifier for which xml export is to be run (not used by --identifiers runs)
 export IDENTIFIER_PREFIX="SQI"
 # Set the language codes table
 export LANGUAGE_CODES_TABLE="<FILL-IN-LANGUAGE_CODES_TABLE>"
+# Optional: local JSON snapshot of the language codes table (created on first run if missing)
+# export LANGUAGE_CODES_SNAPSHOT="language_codes.json"
+# Number of parallel DynamoDB scan segments (1 = sequential scan); items are exported
+# in segment order, so repeated runs export them in the same order
+export SCAN_SEGMENTS="4"
+# Optional: items evaluated per scan page (bounds memory; default is DynamoDB's 1 MB pages)
+# export SCAN_PAGE_SIZE="500"
+# Only rewrite XML files whose content changed (and prune files of deleted/hidden records)
+export INCREMENTAL_EXPORT="false"
+# Only export items modified since the last run (watermark kept in .export_state.json)
+export CHANGES_SINCE_LAST_RUN="false"
+# Both modes track exported files in .export_manifest.json in the output directory
+# Optional: global secondary index on "identifier" (partition key); --identifiers runs fetch
+# the listed items through it with BatchGetItem instead of scanning the table
+# export IDENTIFIER_INDEX="identifier-index"
+# Optional: items per chunk when rendering with worker processes (--workers N)
+# export WORKER_CHUNK_SIZE="50"
+# Export engine: "sync" or "async" (overlaps DynamoDB calls, lookups and file writes)
+export EXPORT_ENGINE="sync"
+# Optional: threads the async engine uses for DynamoDB calls and file writes
+# export ASYNC_IO_THREADS="16"
+# Optional: threads writing XML files behind the sync engine's main loop (0 = write inline)
+# export WRITE_THREADS="4"
+# Optional: write XML files to a hidden temp file and rename it into place (default true)
+# export ATOMIC_WRITES="true"
+# Optional: also write one compressed bundle per collection folder to bundles/, with an
+# index (bundles/<folder>.index.csv): "tar.gz" (the folder's XML files) or "xml.gz"
+# (one <mdRecords> document). Not written by CHANGES_SINCE_LAST_RUN or --identifiers runs;
+# IDENTIFIER_PREFIX/S3_PREFIX runs only replace the bundles of folders they export completely.
+# export OUTPUT_BUNDLES="tar.gz"
+# Optional: "false" writes only the bundles, no per-record XML files
+# export OUTPUT_FILES="true"
+# Console output: "quiet", "progress" (periodic progress line) or "debug" (every per-item line)
+export VERBOSITY="progress"
+# Optional: seconds between progress lines
+# export PROGRESS_INTERVAL="10"
+# Optional: port of the export service (python3 -m dpla_export.service, listens on 127.0.0.1)
+# export EXPORT_SERVICE_PORT="8765"
 # Set ENV to "prod" or "preprod"
 ENV="<FILL-IN-ENV>"
 
@@ -25,6 +63,15 @@ else
 fi
 # Run the export script
 # python3 /home/padmadlp/dpla-va/dlp-dpla-xml-export/dlp-dpla-xml-export.py
+# python3 /home/padmadlp/dpla-va/dlp-dpla-xml-export/dlp-dpla-xml-export.py --workers 4
+# (same as: cd /home/padmadlp/dpla-va/dlp-dpla-xml-export && python3 -m dpla_export --workers 4)
+# Re-export one collection or a few records:
+# python3 /home/padmadlp/dpla-va/dlp-dpla-xml-export/dlp-dpla-xml-export.py --identifier-prefix SQI
+# python3 /home/padmadlp/dpla-va/dlp-dpla-xml-export/dlp-dpla-xml-export.py --identifiers SQI_PO_00001 SQI_PO_00002
+# python3 /home/padmadlp/dpla-va/dlp-dpla-xml-export/dlp-dpla-xml-export.py --identifiers-file logs/invalid_rights_uris_prod_<timestamp>.csv
+# Or keep an export service running and send it jobs:
+# cd /home/padmadlp/dpla-va/dlp-dpla-xml-export && python3 -m dpla_export.service &
+# curl -s -X POST localhost:8765/export -d '{"identifier_prefix": "SQI"}'
 # Run the language codes script
 # python3 /home/padmadlp/dpla-va/dlp-dpla-xml-export/populate_language_codes.py
 # Run the multi-valued format or dimension format script
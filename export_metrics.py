@@ -0,0 +1,99 @@
+"""
+Stage timers and counters for dlp-dpla-xml-export.py.
+
+Each run records how long it spends in each stage (DynamoDB scan, S3 listing,
+filtering, lookups, build_xml, serialization, file writes) and counts calls,
+cache hits and bytes written. The totals are written as a JSON summary in
+logs/ at the end of the run, so runs and environments can be compared.
+
+Stage times are summed over all threads, so a stage run in parallel (e.g. a
+parallel scan) can report more seconds than the run's wall time, and nested
+stages (lookups inside build_xml) are included in the outer stage's time.
+
+Usage:
+  from export_metrics import timed, increment
+
+  with timed('build_xml'):
+      root = build_xml(item)
+  increment('bytes_written', len(data))
+
+  write_summary(path, run_info)
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+
+
+@contextmanager
+def timed(stage_name):
+    """Time the enclosed block and add it to the stage's total and call count"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            stage = _stages.get(stage_name)
+            if stage is None:
+                stage = _stages[stage_name] = {'calls': 0, 'seconds': 0.0}
+            stage['calls'] += 1
+            stage['seconds'] += elapsed
+
+
+def increment(counter_name, amount=1):
+    """Add amount to a counter"""
+    with _lock:
+        _counters[counter_name] = _counters.get(counter_name, 0) + amount
+
+
+def snapshot():
+    """Copy of the current stage totals and counters (e.g. to send from a worker process)"""
+    with _lock:
+        return {
+            'stages': {name: dict(stage) for name, stage in _stages.items()},
+            'counters': dict(_counters),
+        }
+
+
+def merge(metrics):
+    """Add a snapshot from another process to this process's totals"""
+    with _lock:
+        for name, other in metrics['stages'].items():
+            stage = _stages.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            stage['calls'] += other['calls']
+            stage['seconds'] += other['seconds']
+        for name, amount in metrics['counters'].items():
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+def reset():
+    """Clear all stage totals and counters"""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def write_summary(path, run_info):
+    """
+    Write the JSON summary: run_info (run settings and item counts) plus the
+    stage totals and counters.
+
+    Returns:
+        The summary dictionary that was written
+    """
+    metrics = snapshot()
+    summary = dict(run_info)
+    summary['stages'] = {
+        name: {'calls': stage['calls'], 'seconds': round(stage['seconds'], 3)}
+        for name, stage in sorted(metrics['stages'].items())
+    }
+    summary['counters'] = dict(sorted(metrics['counters'].items()))
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+        f.write('\n')
+    return summary
@@ -0,0 +1,103 @@
+"""
+Persistent state for dlp-dpla-xml-export.py between runs.
+
+Two JSON files are kept next to the exported collection folders (root-level
+files are not part of the folder sync):
+
+- The state file records the change-data-capture high-water mark for each
+  items table/identifier prefix, so a run with CHANGES_SINCE_LAST_RUN=true only
+  exports items modified since the previous run.
+- The manifest maps each exported identifier to its XML file (relative path,
+  content hash and the run that last exported it), so orphaned files can be
+  pruned without walking the collection folders.
+
+Usage:
+  from export_state import (load_state, save_state, get_watermark, set_watermark,
+                            load_manifest, save_manifest)
+
+  state = load_state(path)
+  since = get_watermark(state, table_name, prefix)
+  ...
+  set_watermark(state, table_name, prefix, new_watermark)
+  save_state(path, state)
+
+  manifest = load_manifest(manifest_path)
+  manifest[identifier] = {'path': 'SQI/SQI_PO_00001.xml', 'hash': ..., 'last_seen': run_id}
+  save_manifest(manifest_path, manifest)
+"""
+import json
+import os
+
+# Default state and manifest file names, created in the export output directory
+STATE_FILENAME = '.export_state.json'
+MANIFEST_FILENAME = '.export_manifest.json'
+
+
+def load_state(path):
+    """
+    Load the export state file.
+
+    Returns:
+        The state dictionary, or an empty state if the file does not exist
+    """
+    if not os.path.exists(path):
+        return {'watermarks': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    state.setdefault('watermarks', {})
+    return state
+
+
+def save_state(path, state):
+    """Write the export state file atomically (temp file + rename)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def load_manifest(path):
+    """
+    Load the export manifest.
+
+    Returns:
+        Dictionary mapping identifier to {'path', 'hash', 'last_seen'},
+        or None if no manifest exists yet
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(path, manifest):
+    """Write the export manifest atomically (one entry per line)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for i, key in enumerate(sorted(manifest)):
+            separator = ',' if i < len(manifest) - 1 else ''
+            f.write(f"{json.dumps(key)}: {json.dumps(manifest[key], sort_keys=True)}{separator}\n")
+        f.write('}\n')
+    os.replace(tmp_path, path)
+
+
+def _watermark_key(table_name, identifier_prefix):
+    # A prefix-filtered run only sees part of the table, so it gets its own watermark
+    return f"{table_name}|{(identifier_prefix or '*').upper()}"
+
+
+def get_watermark(state, table_name, identifier_prefix=None):
+    """
+    Get the high-water mark (latest updatedAt/createdAt exported) for a table and prefix.
+
+    Returns:
+        The ISO-8601 timestamp string, or None if no run has completed yet
+    """
+    return state['watermarks'].get(_watermark_key(table_name, identifier_prefix))
+
+
+def set_watermark(state, table_name, identifier_prefix, watermark):
+    """Record the high-water mark for a table and prefix"""
+    state['watermarks'][_watermark_key(table_name, identifier_prefix)] = watermark
@@ -1,8 +1,9 @@
-import boto3
 import os
 from datetime import datetime
 from collections import defaultdict
 
+from aws_clients import get_client, get_table
+
 # --- CONFIGURATION ---
 region = os.environ.get('REGION')
 folder_lookup_table = os.environ.get('FOLDER_LOOKUP_TABLE')
@@ -11,7 +12,7 @@ prefix = os.environ.get('S3_PREFIX')
 print(f"DEBUG: REGION={region}, FOLDER_LOOKUP_TABLE={folder_lookup_table}")
 print(f"DEBUG: Scanning S3 bucket '{bucket_name}' with prefix '{prefix}'")
 
-s3 = boto3.client('s3')
+s3 = get_client('s3', region)
 paginator = s3.get_paginator('list_objects_v2')
 page_iterator = paginator.paginate(Bucket=bucket_name, Prefix=prefix)
 
@@ -77,8 +78,7 @@ folder_mapping = {
 }
 
 # --- Write all folder names and their files to DynamoDB ---
-dynamodb = boto3.resource('dynamodb', region_name=region)
-table = dynamodb.Table(folder_lookup_table)
+table = get_table(folder_lookup_table, region)
 print("DEBUG: DynamoDB resource and table initialized.")
 
 for folder, file_list in folder_files.items():
@@ -12,11 +12,12 @@ Usage:
 
 Set AWS credentials and region in your environment or ~/.aws/credentials.
 """
-import boto3
 import requests
 from bs4 import BeautifulSoup
 import os
 
+from aws_clients import get_resource
+
 # quit()
 # Configuration
 LANGUAGE_CODES_TABLE = os.environ.get('LANGUAGE_CODES_TABLE')
@@ -31,7 +32,7 @@ soup = BeautifulSoup(response.text, "html.parser")
 
 # Connect to DynamoDB
 print(f"Connecting to DynamoDB table '{LANGUAGE_CODES_TABLE}' in region '{REGION}' ...")
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
+dynamodb = get_resource('dynamodb', REGION)
 
 def create_table_if_not_exists():
     existing_tables = [t.name for t in dynamodb.tables.all()]
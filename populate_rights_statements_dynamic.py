@@ -24,12 +24,13 @@ Usage:
 
 Set AWS credentials in your environment or ~/.aws/credentials.
 """
-import boto3
 import os
 import sys
 import re
 from datetime import datetime
 
+from aws_clients import get_table
+
 try:
     import requests
     from bs4 import BeautifulSoup
@@ -59,8 +60,7 @@ print(f"========================================\n")
 
 # Connect to DynamoDB
 try:
-    dynamodb = boto3.resource('dynamodb', region_name=REGION)
-    table = dynamodb.Table(TABLE_NAME)
+    table = get_table(TABLE_NAME, REGION)
     print(f"✅ Connected to DynamoDB table '{TABLE_NAME}'")
 except Exception as e:
     print(f"❌ ERROR: Failed to connect to DynamoDB: {e}")
@@ -1,17 +1,17 @@
 
 import os
-import boto3
 import re
 from boto3.dynamodb.conditions import Attr
 from datetime import datetime
 
+from aws_clients import get_table
+
 # Set up DynamoDB resource
 
 region = os.environ.get('REGION')
 table_name = os.environ.get('DYNAMODB_TABLE')
 
-dynamodb = boto3.resource('dynamodb', region_name=region)
-table = dynamodb.Table(table_name)
+table = get_table(table_name, region)
 
 dimension_pattern = re.compile(r'\b\d+\s*(in\.|cm|mm|ft|inches|feet)\b', re.IGNORECASE)
 
@@ -1,8 +1,9 @@
-import boto3
 import csv
 import os
 from datetime import datetime
 
+from aws_clients import get_table
+
 # Get configuration from environment variables
 REGION = os.getenv("REGION")
 DYNAMODB_TABLE = os.getenv("DYNAMODB_TABLE")
@@ -17,8 +18,7 @@ print(f"Using region: {REGION}")
 print(f"Using DynamoDB table: {DYNAMODB_TABLE}")
 
 # Initialize DynamoDB
-dynamodb = boto3.resource("dynamodb", region_name=REGION)
-dbtable = dynamodb.Table(DYNAMODB_TABLE)
+dbtable = get_table(DYNAMODB_TABLE, REGION)
 
 def scan_items_without_format_physical():
     """
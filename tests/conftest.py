@@ -0,0 +1,33 @@
+"""
+Shared fixtures for the tests over the committed output folders.
+
+The exported XML files committed at the repo root (SQI/, NMCST/, currie/currie-asia/, ...)
+are the reference output: the tests check that the exporter still produces them.
+"""
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Folders at the repo root that are not exported collections
+NOT_OUTPUT_DIRS = {'.git', '.github', 'dpla_export', 'tests', 'logs', 'bundles', '__pycache__'}
+
+sys.path.insert(0, REPO_ROOT)
+
+@pytest.fixture(scope='session')
+def committed_xml_files():
+    """(output folder, path) of every XML file in the committed output folders"""
+    files = []
+    for name in sorted(os.listdir(REPO_ROOT)):
+        top = os.path.join(REPO_ROOT, name)
+        if name in NOT_OUTPUT_DIRS or name.startswith('.') or not os.path.isdir(top):
+            continue
+        for dir_path, dir_names, file_names in os.walk(top):
+            dir_names.sort()
+            folder = os.path.relpath(dir_path, REPO_ROOT).replace(os.sep, '/')
+            files.extend((folder, os.path.join(dir_path, file_name))
+                         for file_name in sorted(file_names) if file_name.endswith('.xml'))
+    if not files:
+        pytest.skip('no committed XML folders in this checkout')
+    return files
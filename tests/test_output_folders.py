@@ -0,0 +1,38 @@
+"""
+Conformance test for get_output_subdir: the identifier of every committed XML file
+must route to the folder the file is committed in.
+"""
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from dpla_export.records import NSMAP, get_output_subdir
+
+IDENTIFIER_TAG = f"{{{NSMAP['dcterms']}}}identifier"
+
+def test_committed_identifiers_route_to_their_folder(committed_xml_files):
+    misrouted = []
+    checked = 0
+    for folder, path in committed_xml_files:
+        identifier = ET.parse(path).getroot().findtext(IDENTIFIER_TAG)
+        if not identifier:
+            continue
+        checked += 1
+        if get_output_subdir(identifier) != folder:
+            misrouted.append((identifier, folder, get_output_subdir(identifier)))
+    assert checked
+    assert not misrouted, f'{len(misrouted)} of {checked} identifiers misrouted, e.g. {misrouted[:5]}'
+
+@pytest.mark.parametrize('identifier, folder', [
+    ('BTR_001', 'BTR'),
+    ('CEC_EEC_001', 'CEC_EEC'),
+    ('FCHS_ARC_001', 'FCHS_ARC'),
+    ('LD5655.A3.C3_001', 'LD5655.A3.C3'),
+    ('LJC_118_001', 'currie/currie-asia'),
+    # Ms collections keep the Ms prefix and uppercase the rest, whatever the identifier's case
+    ('Ms1992_028_Rodeck_B1_F1', 'Ms1992_028_RODECK'),
+    ('ms1992_028_rodeck_b1', 'Ms1992_028_RODECK'),
+    ('MS1992_028_RODECK_X', 'Ms1992_028_RODECK'),
+])
+def test_documented_routes(identifier, folder):
+    assert get_output_subdir(identifier) == folder
@@ -0,0 +1,16 @@
+"""
+Golden test for serialize_record: every committed XML file, parsed back into an
+mdRecord tree, must serialize to exactly the bytes in the file.
+"""
+import xml.etree.ElementTree as ET
+
+from dpla_export.records import serialize_record
+
+def test_committed_files_reserialize_byte_identical(committed_xml_files):
+    mismatches = []
+    for _, path in committed_xml_files:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if serialize_record(ET.fromstring(data)).encode('utf-8') != data:
+            mismatches.append(path)
+    assert not mismatches, f'{len(mismatches)} of {len(committed_xml_files)} files differ, e.g. {mismatches[:5]}'
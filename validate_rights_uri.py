@@ -6,6 +6,7 @@ This script provides:
 2. A standalone validation tool for testing
 3. Batch validation for multiple URIs
 4. Integration examples for use in dlp-dpla-xml-export.py
+5. Suggested corrections for invalid URIs (correct_rights_uri)
 
 Requirements:
 - boto3
@@ -20,13 +21,19 @@ Usage:
   # Or import into your script
   from validate_rights_uri import validate_rights_uri, get_rights_info
 
+The RightsStatement table is read once (see load_rights_registry) and all
+lookups after that are answered from memory.
+
 Set AWS credentials in your environment or ~/.aws/credentials.
 """
-import boto3
+import functools
 import os
+import re
 import sys
 from typing import Tuple, Optional, Dict
 
+from aws_clients import get_resource
+
 # Configuration from environment variables
 REGION = os.environ.get('REGION')
 ENV = os.environ.get('ENV')
@@ -38,6 +45,20 @@ TABLE_NAME = 'RightsStatement'
 _dynamodb = None
 _table = None
 
+# In-memory copy of the RightsStatement table keyed by RightsURI (lazy loading)
+_rights_registry = None
+_rights_registry_error = None
+
+# rightsstatements.org / creativecommons.org URL inside HTML or text, up to its version (1.0 or 4.0)
+RIGHTS_URL_PATTERN = re.compile(r'https?://(?:rightsstatements\.org|creativecommons\.org)[^\s<>"?]*?/(?:1\.0|4\.0)/?')
+# Scheme and host of a rights URL, and a rightsstatements.org /page/ path to turn into /vocab/
+RIGHTS_HOST_PATTERN = re.compile(r'https?://(?:(rightsstatements\.org)(/page/)?|(creativecommons\.org))')
+# Scheme of the canonical URIs: http for rightsstatements.org vocab URIs, https for Creative Commons
+CANONICAL_SCHEMES = {'rightsstatements.org': 'http', 'creativecommons.org': 'https'}
+
+# Distinct rights strings whose correction correct_rights_uri remembers
+RIGHTS_URI_CACHE_SIZE = 65536
+
 
 def get_dynamodb_table():
     """Get or create DynamoDB table connection"""
@@ -45,7 +66,7 @@ def get_dynamodb_table():
     
     if _table is None:
         try:
-            _dynamodb = boto3.resource('dynamodb', region_name=REGION)
+            _dynamodb = get_resource('dynamodb', REGION)
             _table = _dynamodb.Table(TABLE_NAME)
         except Exception as e:
             print(f"❌ ERROR: Failed to connect to DynamoDB: {e}")
@@ -54,6 +75,55 @@ def get_dynamodb_table():
     return _table
 
 
+def load_rights_registry() -> Dict[str, Dict]:
+    """
+    Load the whole RightsStatement table into memory with a single paginated scan.
+    
+    The table only holds a few dozen statements, so validation and info lookups
+    are answered from this registry instead of one GetItem per call.
+    
+    Returns:
+        Dictionary mapping RightsURI to the full table item
+        
+    Raises:
+        Exception: If the table cannot be scanned (the error is kept and
+        reported by later lookups instead of retrying on every call)
+    """
+    global _rights_registry, _rights_registry_error
+    
+    if _rights_registry is not None:
+        return _rights_registry
+    if _rights_registry_error is not None:
+        raise _rights_registry_error
+    
+    try:
+        table = get_dynamodb_table()
+        response = table.scan()
+        rows = response.get('Items', [])
+        while 'LastEvaluatedKey' in response:
+            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+            rows.extend(response.get('Items', []))
+    except Exception as e:
+        _rights_registry_error = e
+        raise
+    
+    _rights_registry = {row['RightsURI']: row for row in rows if row.get('RightsURI')}
+    return _rights_registry
+
+
+def use_rights_registry(registry: Dict[str, Dict]) -> None:
+    """
+    Use an already-loaded registry (from load_rights_registry in another process)
+    instead of scanning the table again.
+    
+    Args:
+        registry: Dictionary mapping RightsURI to the full table item
+    """
+    global _rights_registry, _rights_registry_error
+    _rights_registry = registry
+    _rights_registry_error = None
+
+
 def normalize_rights_uri(rights_uri: str) -> str:
     """
     Normalize a rights URI by removing query parameters.
@@ -75,10 +145,53 @@ def normalize_rights_uri(rights_uri: str) -> str:
         return rights_uri
     
     # Strip query parameters (everything after '?')
-    if '?' in rights_uri:
-        rights_uri = rights_uri.split('?')[0]
+    return rights_uri.partition('?')[0]
+
+
+def _canonical_rights_host(match: re.Match) -> str:
+    """Canonical scheme and host for a RIGHTS_HOST_PATTERN match, with /page/ turned into /vocab/"""
+    rightsstatements_host, page, creativecommons_host = match.groups()
+    host = rightsstatements_host or creativecommons_host
+    return f"{CANONICAL_SCHEMES[host]}://{host}{'/vocab/' if page else ''}"
+
+
+@functools.lru_cache(maxsize=RIGHTS_URI_CACHE_SIZE)
+def correct_rights_uri(uri: str) -> str:
+    """
+    Correct common issues in rights URIs, for the invalid rights report.
+    
+    1. Extract the URL from HTML/paragraph content if present (the last one)
+    2. Replace /page/ with /vocab/ in rightsstatements.org URLs
+    3. Use the canonical scheme: http for rightsstatements.org, https for creativecommons.org
+    4. Remove query parameters like ?language=en
+    5. Ensure a trailing slash
+    
+    The patterns are compiled once and each distinct input is corrected once, so
+    reports over messy legacy data only pay for the distinct strings.
+    
+    Args:
+        uri: The original URI (may contain HTML/paragraph text)
+        
+    Returns:
+        Corrected URI string ('' for an empty URI)
+        
+    Examples:
+        >>> correct_rights_uri('<p>See https://rightsstatements.org/page/InC/1.0/?language=en</p>')
+        'http://rightsstatements.org/vocab/InC/1.0/'
+    """
+    if not uri or uri == '(empty)':
+        return ''
     
-    return rights_uri
+    matches = RIGHTS_URL_PATTERN.findall(uri)
+    if matches:
+        uri = matches[-1]
+    uri = uri.partition('?')[0]
+    
+    uri = RIGHTS_HOST_PATTERN.sub(_canonical_rights_host, uri)
+    
+    if not uri.endswith('/'):
+        uri += '/'
+    return uri
 
 
 def validate_rights_uri(rights_uri: str) -> Tuple[bool, Optional[str], Optional[str]]:
@@ -114,16 +227,14 @@ def validate_rights_uri(rights_uri: str) -> Tuple[bool, Optional[str], Optional[
         return False, None, "Invalid URI: rightsstatements.org must use /vocab/ not /page/ for metadata"
     
     try:
-        table = get_dynamodb_table()
+        registry = load_rights_registry()
         
-        # Query the table with normalized URI
-        response = table.get_item(Key={'RightsURI': normalized_uri})
+        # Look up the normalized URI in the in-memory registry
+        item = registry.get(normalized_uri)
         
-        if 'Item' not in response:
+        if item is None:
             return False, None, f"URI not found in RightsStatement table"
         
-        item = response['Item']
-        
         # Check if the statement is active
         if not item.get('IsActive', False):
             return False, item.get('RightsCode'), f"Rights statement is marked as inactive"
@@ -157,11 +268,11 @@ def get_rights_info(rights_uri: str) -> Optional[Dict]:
     normalized_uri = normalize_rights_uri(rights_uri)
     
     try:
-        table = get_dynamodb_table()
-        response = table.get_item(Key={'RightsURI': normalized_uri})
+        registry = load_rights_registry()
+        item = registry.get(normalized_uri)
         
-        if 'Item' in response:
-            return dict(response['Item'])
+        if item is not None:
+            return dict(item)
         else:
             return None
             